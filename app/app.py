@@ -2,8 +2,10 @@
 import streamlit as st
 import pandas as pd
 import io
-import re
-import datetime
+import shutil
+import tempfile
+import time
+from collections import deque
 from datetime import date
 import sys, os
 from pathlib import Path
@@ -15,58 +17,38 @@ try:
 except Exception:
     HAS_SHADCN = False
 
-import spacy
-
-# --- Projekt-Root in den Pfad aufnehmen (wenn nötig) ---
-ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-if ROOT not in sys.path:
-    sys.path.insert(0, ROOT)
-
-# --- Utils importieren ---
-from utils.pdf_reader import extract_text_from_pdf
-from utils.ocr_reader import ocr_from_pdf
-from utils.patterns import FIELD_PATTERNS
-# Optional: Validierung
-try:
-    from validation import validate_fields
-except Exception:
-    validate_fields = None
-
-
-
-
-
 # --- Projekt-Root in den Pfad aufnehmen (wenn nötig) ---
 ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if ROOT not in sys.path:
     sys.path.insert(0, ROOT)
 
 # --- Utils importieren ---
-from utils.pdf_reader import extract_text_from_pdf
-from utils.ocr_reader import ocr_from_pdf
 from utils.patterns import FIELD_PATTERNS
+from utils.extractor import InvoiceExtractor, NOT_FOUND
+from utils.document import PdfDocument, FileTooLarge
+from utils.cache import DiskLRUCache, CACHE_DIR
+from utils.sinks import JsonlSink, read_jsonl, write_excel
+from utils.metrics import stage, start_metrics_server, METRICS_PORT
 # Optional: Validierung
 try:
     from validation import validate_fields
 except Exception:
     validate_fields = None
 
-# --- NER-Modell laden ---
-def load_ner_model():
-    """
-    Lädt dein trainiertes spaCy-Modell aus models/.
-    Bevorzugt 'ner_model_best', fällt zurück auf 'ner_model'.
-    """
-    try:
-        return spacy.load(os.path.join(ROOT, "models", "ner_model_best"))
-    except Exception:
-        try:
-            return spacy.load(os.path.join(ROOT, "models", "ner_model"))
-        except Exception:
-            return None
-
-nlp = load_ner_model()
-if nlp is None:
+# --- Extraktions-Engine (lädt das NER-Modell aus models/) ---
+@st.cache_resource(show_spinner="Lade NER-Modell …")
+def get_extractor():
+    """Eine Engine pro Server-Prozess, von allen Sessions geteilt; beim ersten Aufruf vorgewärmt."""
+    # Ergebnis-Cache speichert Text auf der Platte → nur mit RESULT_CACHE=1 (siehe Datenschutzhinweis)
+    cache = DiskLRUCache(CACHE_DIR / "results.sqlite") if os.environ.get("RESULT_CACHE") == "1" else None
+    # Lieferanten-Vorlagen (nur Labels und Koordinaten) greifen mit TEMPLATES=1 über die Engine selbst
+    # Optional: Prometheus-Metriken der Pipeline-Stufen unter http://127.0.0.1:<METRICS_PORT>/metrics
+    if METRICS_PORT:
+        start_metrics_server(METRICS_PORT)
+    return InvoiceExtractor(cache=cache).warmup()
+
+extractor = get_extractor()
+if extractor.nlp is None:
     st.error("❌ Konnte das NER-Modell nicht laden. Lege einen Ordner 'models/ner_model_best' oder 'models/ner_model' ab.")
 
 # --- CSS laden ---
@@ -90,9 +72,44 @@ inject_css()
 # ---------------------- Session-State init & Quota ----------------------
 FREE_QUOTA = 5
 MAX_FILESIZE_MB = 5
+PREVIEW_ROWS = 200  # angezeigte Tabellenzeilen; alle Ergebnisse liegen in der Session-JSONL
+
+# Session-Ordner, die länger liegen (z. B. nach einem Absturz des Servers), werden entfernt
+SESSION_FILES_TTL = 24 * 3600
+
+@st.cache_resource
+def sweep_stale_results():
+    """Einmal pro Server-Prozess: verwaiste Session-Ordner älter als SESSION_FILES_TTL löschen."""
+    cutoff = time.time() - SESSION_FILES_TTL
+    for d in Path(tempfile.gettempdir()).glob("pdf_transfer_*"):
+        if not d.is_dir():
+            continue
+        # zuletzt geschrieben = jüngste Datei im Ordner (JSONL wird angehängt)
+        if max((f.stat().st_mtime for f in d.iterdir()), default=d.stat().st_mtime) < cutoff:
+            shutil.rmtree(d, ignore_errors=True)
+    return True
 
-if "data" not in st.session_state:
-    st.session_state["data"] = []
+def reset_results():
+    """
+    Ergebnisse der Session verwerfen und eine leere Session-JSONL anlegen.
+    TemporaryDirectory löscht den Ordner auch, sobald Streamlit die abgelaufene Session
+    verwirft (Garbage Collection des Session-States) oder der Server beendet wird.
+    """
+    old = st.session_state.get("results_dir")
+    if old is not None:
+        old.cleanup()
+    results_dir = tempfile.TemporaryDirectory(prefix="pdf_transfer_")
+    st.session_state["results_dir"] = results_dir
+    st.session_state["results_path"] = os.path.join(results_dir.name, "ergebnisse.jsonl")
+    st.session_state["n_rows"] = 0
+    st.session_state["columns"] = []
+    st.session_state["preview"] = deque(maxlen=PREVIEW_ROWS)
+    st.session_state.pop("xlsx", None)
+
+sweep_stale_results()
+if "results_path" not in st.session_state:
+    # Ergebnisse pro Session als JSONL im Temp-Verzeichnis statt als Liste im Session-State
+    reset_results()
 if "used_quota" not in st.session_state:
     st.session_state["used_quota"] = 0
 if "quota_date" not in st.session_state or st.session_state["quota_date"] != date.today().isoformat():
@@ -120,55 +137,6 @@ st.markdown(f"""
 
 
 
-# ---------------------- Feld-Mapping & Normalisierung ----------------------
-NER_TO_FIELD = {
-    "RECHNUNGSNUMMER": "Rechnungsnummer",
-    "RECHNUNGSDATUM": "Datum",
-    "LEISTUNGSDATUM": "Leistungsdatum",
-    "ZAHLUNGSZIEL": "Zahlungsziel",
-    "LEISTUNG": "Leistung",
-    "ZWISCHENSUMME_NETTO": "Zwischensumme",
-    "UST_BETRAG": "USt_Betrag",
-    "UST_ID": "UID",
-    "STEUERSATZ": "Steuersatz",
-    "BRUTTOBETRAG": "Betrag (€)",
-    "WÄHRUNG": "Währung",
-    "IBAN": "IBAN",
-    "BIC": "BIC",
-    "FIRMENNAME": "Firmenname",
-    "ADRESSE": "Adresse",
-    "EMAIL": "E-Mail",
-    "RECHNUNGSEMPFÄNGER": "Rechnungsempfänger",
-    "KUNDENNUMMER": "Kundennummer",
-    "BESTELLNUMMER": "Bestellnummer",
-}
-
-AMOUNT_FIELDS = {"Betrag (€)", "Zwischensumme", "USt_Betrag"}
-DATE_FIELDS   = {"Datum", "Leistungsdatum", "Zahlungsziel"}
-
-def normalize_amount(s: str) -> str:
-    if not s:
-        return s
-    s = s.strip().replace("€", "").replace("EUR", "").replace("eur", "").replace("\u00A0", " ")
-    s = s.replace(" ", "").replace(".", "").replace(",", ".")
-    m = re.search(r"[+-]?\d+(?:\.\d+)?", s)
-    return m.group(0) if m else s
-
-def normalize_date(s: str) -> str:
-    if not s:
-        return s
-    s = s.strip().replace("\u00A0", " ")
-    fmts = ["%d.%m.%Y", "%d.%m.%y", "%Y-%m-%d", "%Y.%m.%d"]
-    for fmt in fmts:
-        try:
-            return datetime.datetime.strptime(s, fmt).date().isoformat()
-        except ValueError:
-            pass
-    m = re.search(r"\b(\d{1,2}\.\d{1,2}\.\d{2,4})\b", s)
-    if m:
-        return normalize_date(m.group(1))
-    return s
-
 # ---------------------- Felder auswählen ----------------------
 # ---------------------- Felder auswählen ----------------------
 st.markdown("<h1>Felder auswählen</h1>", unsafe_allow_html=True)
@@ -241,92 +209,92 @@ if start_clicked:
     files_to_process = (pdf_files or [])[:quota_left()]
     processed = 0
 
+    # Dateien einsammeln: PdfDocument prüft das Größenlimit über UploadedFile.size, bevor es den
+    # Inhalt liest; Text, OCR und Cache arbeiten danach auf denselben Bytes.
+    batch = []
     for pdf_file in files_to_process:
-        pdf_bytes = pdf_file.read()
-        # ... dein bestehender Code ...
-
-
-        # Größenlimit
-        if len(pdf_bytes) > MAX_FILESIZE_MB * 1024 * 1024:
+        try:
+            batch.append((pdf_file.name, PdfDocument(pdf_file, max_bytes=MAX_FILESIZE_MB * 1024 * 1024)))
+        except FileTooLarge:
             st.warning(f"{pdf_file.name}: Datei größer als {MAX_FILESIZE_MB} MB – übersprungen.")
-            continue
 
-        # Text beschaffen (PDF-Extraktion, ggf. OCR)
-        text = extract_text_from_pdf(io.BytesIO(pdf_bytes)) or ""
-        if not text.strip():
-            text = ocr_from_pdf(io.BytesIO(pdf_bytes)) or ""
-
-        # --- NER ---
-        ner_values = {}
-        if nlp:
-            doc = nlp(text)
-            for ent in doc.ents:
-                fld = NER_TO_FIELD.get(ent.label_)
-                if not fld or fld in ner_values:
-                    continue
-                val = ent.text.strip()
-                if fld in AMOUNT_FIELDS:
-                    val = normalize_amount(val)
-                elif fld in DATE_FIELDS:
-                    val = normalize_date(val)
-                ner_values[fld] = val
-
-        # --- Regex-Fallback für ausgewählte Felder ---
-        parsed = {}
-        for field in selected_fields:
-            if field in ner_values and ner_values[field]:
-                parsed[field] = ner_values[field]
+    # PyMuPDF-Arbeit nacheinander, OCR parallel, NER je Datei; Ergebnisse erscheinen, sobald eine Datei fertig ist
+    records = extractor.extract_completed((doc for _, doc in batch), selected_fields)
+    sink = JsonlSink(st.session_state["results_path"])
+    progress = st.progress(0.0, text=f"0 von {len(batch)} Datei(en) analysiert")
+
+    try:
+        for done, (i, parsed) in enumerate(records, 1):
+            name = batch[i][0]
+            progress.progress(done / len(batch), text=f"{done} von {len(batch)} Datei(en) analysiert")
+
+            # Fehlerhafte Datei (z. B. kein gültiges PDF) melden, die übrigen laufen weiter
+            if isinstance(parsed, Exception):
+                st.error(f"{name}: Datei konnte nicht verarbeitet werden ({type(parsed).__name__}: {parsed})")
+                continue
+
+            # --- Validierung ---
+            if validate_fields:
+                with stage("validate"):
+                    issues = validate_fields(parsed)
+                if issues:
+                    for k, msg in issues.items():
+                        st.warning(f"{k}: {msg}")
+
+            # Ergebnis speichern
+            if any(val != NOT_FOUND for val in parsed.values()):
+                sink.write(parsed)
+                st.session_state["n_rows"] += 1
+                st.session_state["preview"].append(parsed)
+                st.session_state["columns"].extend(k for k in parsed if k not in st.session_state["columns"])
+                st.success(f"Daten extrahiert aus: {name}")
             else:
-                pattern = FIELD_PATTERNS.get(field)
-                if pattern:
-                    m = re.search(pattern, text)
-                    val = m.group(1) if m else "Nicht gefunden"
-                    if field in AMOUNT_FIELDS and val != "Nicht gefunden":
-                        val = normalize_amount(val)
-                    elif field in DATE_FIELDS and val != "Nicht gefunden":
-                        val = normalize_date(val)
-                    parsed[field] = val
-                else:
-                    parsed[field] = "Nicht definiert"
-
-        # --- Validierung ---
-        if validate_fields:
-            issues = validate_fields(parsed)
-            if issues:
-                for k, msg in issues.items():
-                    st.warning(f"{k}: {msg}")
-
-        # Ergebnis speichern
-        if any(val != "Nicht gefunden" for val in parsed.values()):
-            st.session_state["data"].append(parsed)
-            st.success(f"Daten extrahiert aus: {pdf_file.name}")
-        else:
-            st.warning(f"Keine relevanten Daten in {pdf_file.name} gefunden.")
-
-        processed += 1
-
-    # Quota erhöhen
-    st.session_state["used_quota"] += processed
+                st.warning(f"Keine relevanten Daten in {name} gefunden.")
+
+            processed += 1
+    finally:
+        sink.close()
+        progress.empty()
+        for _, doc in batch:
+            doc.close()
+        # Quota erhöhen (nur tatsächlich analysierte Dateien)
+        st.session_state["used_quota"] += processed
 
 
 
 # ---------------------- Ergebnisse / Excel ----------------------
-if st.session_state["data"]:
+def build_excel() -> bytes:
+    """Excel aus der Session-JSONL, gestreamt über openpyxl write-only."""
+    buffer = io.BytesIO()
+    write_excel(read_jsonl(st.session_state["results_path"]), buffer, st.session_state["columns"])
+    return buffer.getvalue()
+
+n_rows = st.session_state["n_rows"]
+if n_rows:
     st.header("📊 Ergebnisse als Excel-Datei")
-    df = pd.DataFrame(st.session_state["data"])
+    df = pd.DataFrame(list(st.session_state["preview"]), columns=st.session_state["columns"])
     st.dataframe(df, use_container_width=True)
-
-    buffer = io.BytesIO()
-    with pd.ExcelWriter(buffer, engine="openpyxl") as writer:
-        df.to_excel(writer, index=False)
-    buffer.seek(0)
-
-    st.download_button(
-        label="📥 Excel-Datei herunterladen",
-        data=buffer,
-        file_name="extraktion.xlsx",
-        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-    )
+    if n_rows > PREVIEW_ROWS:
+        st.caption(f"Vorschau: die letzten {PREVIEW_ROWS} von {n_rows} Zeilen. Die Excel-Datei enthält alle.")
+
+    # Excel nur auf Anforderung bauen und behalten, bis neue Zeilen dazukommen
+    xlsx = st.session_state.get("xlsx")
+    if not xlsx or xlsx[0] != n_rows:
+        if st.button("Excel-Datei erstellen", key="build-xlsx"):
+            xlsx = (n_rows, build_excel())
+            st.session_state["xlsx"] = xlsx
+
+    if xlsx and xlsx[0] == n_rows:
+        st.download_button(
+            label="📥 Excel-Datei herunterladen",
+            data=xlsx[1],
+            file_name="extraktion.xlsx",
+            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        )
+
+    if st.button("Ergebnisse löschen", key="reset-results"):
+        reset_results()
+        st.rerun()
 
 # Hinweis bei ausgeschöpfter Quota
 if quota_left() == 0:
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+cache.py – persistenter Key/Value-Cache auf SQLite-Basis mit LRU-Verdrängung
+Werte werden als JSON gespeichert; überschreitet die Datenbank MAX_BYTES,
+fliegen die am längsten nicht gelesenen Einträge zuerst raus.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[2]
+CACHE_DIR = Path(os.environ.get("PDF_TRANSFER_CACHE_DIR", ROOT / ".cache"))
+CACHE_MAX_MB = int(os.environ.get("PDF_TRANSFER_CACHE_MAX_MB", "256"))
+# Die Gesamtgröße wird mitgezählt; alle n Schreibvorgänge wird sie neu aus der Datenbank gelesen,
+# damit Einträge anderer Prozesse (Batch-/Dienst-Worker auf derselben Datei) mitzählen
+CACHE_RESYNC_PUTS = 256
+
+
+class DiskLRUCache:
+    """
+    Thread-sicherer JSON-Cache in einer SQLite-Datei, begrenzt auf max_bytes.
+    Die Gesamtgröße wird mitgeführt, ein put kostet also keinen Tabellenscan; gescannt wird nur
+    zum Verdrängen und alle CACHE_RESYNC_PUTS Schreibvorgänge zum Abgleich.
+    """
+
+    def __init__(self, path, max_bytes=CACHE_MAX_MB * 1024 * 1024):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False)
+        with self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " key TEXT PRIMARY KEY, value BLOB NOT NULL,"
+                " size INTEGER NOT NULL, accessed REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_accessed ON entries(accessed)")
+        self._total = self._stored_bytes()
+        self._puts = 0
+
+    def _stored_bytes(self):
+        return self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def get(self, key):
+        with self._lock:
+            row = self._db.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            with self._db:
+                self._db.execute("UPDATE entries SET accessed = ? WHERE key = ?", (time.time(), key))
+        return json.loads(row[0])
+
+    def put(self, key, value):
+        blob = json.dumps(value, ensure_ascii=False).encode("utf-8")
+        with self._lock, self._db:
+            old = self._db.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, accessed) VALUES (?, ?, ?, ?)",
+                (key, blob, len(blob), time.time()),
+            )
+            self._total += len(blob) - (old[0] if old else 0)
+            self._puts += 1
+            if self._puts % CACHE_RESYNC_PUTS == 0:
+                self._total = self._stored_bytes()
+            if self._total > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """Älteste Einträge löschen, bis die Gesamtgröße wieder unter max_bytes liegt."""
+        total = self._stored_bytes()  # Stand aller Prozesse, nicht nur der eigenen Schreibvorgänge
+        stale = []
+        if total > self.max_bytes:
+            for key, size in self._db.execute("SELECT key, size FROM entries ORDER BY accessed"):
+                if total <= self.max_bytes:
+                    break
+                stale.append((key,))
+                total -= size
+            self._db.executemany("DELETE FROM entries WHERE key = ?", stale)
+        self._total = total
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+document.py – ein PDF, einmal gepuffert und einmal geparst
+Größe wird vor dem Einlesen geprüft; Textebene, OCR-Rasterung und Cache-Hash
+arbeiten auf denselben Bytes und demselben PyMuPDF-Dokument.
+"""
+
+import hashlib
+import io
+import os
+from pathlib import Path
+
+import fitz  # PyMuPDF
+
+from .pdf_reader import BACKENDS, MAX_PAGES, TEXT_BACKEND, iter_fitz_pages
+from .ocr_reader import submit_ocr
+from .layout import page_regions, layout_text
+
+
+class FileTooLarge(ValueError):
+    """PDF überschreitet das Größenlimit (vor dem Einlesen erkannt)."""
+
+
+def source_size(source):
+    """Größe in Bytes ohne den Inhalt zu lesen; None, wenn sie sich nicht vorab bestimmen lässt."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return memoryview(source).nbytes
+    if isinstance(source, (str, Path)):
+        return os.path.getsize(source)
+    if getattr(source, "size", None) is not None:  # z. B. Streamlit UploadedFile
+        return int(source.size)
+    if hasattr(source, "getbuffer"):
+        return source.getbuffer().nbytes
+    if hasattr(source, "seek") and hasattr(source, "tell"):
+        pos = source.tell()
+        size = source.seek(0, os.SEEK_END)
+        source.seek(pos)
+        return size - pos
+    return None
+
+
+def _load_bytes(source) -> bytes:
+    """Genau eine bytes-Kopie des Inhalts (PyMuPDF verlangt bytes); Datei-Objekte bleiben zurückgespult."""
+    if isinstance(source, bytes):
+        return source
+    if isinstance(source, (bytearray, memoryview)):
+        return bytes(source)
+    if isinstance(source, (str, Path)):
+        return Path(source).read_bytes()
+    if hasattr(source, "getvalue"):
+        return source.getvalue()
+    data = source.read()
+    if hasattr(source, "seek"):
+        source.seek(0)
+    return data
+
+
+class PdfDocument:
+    """
+    Geteiltes Handle für ein PDF: data (bytes) wird einmal gelesen, fitz öffnet es
+    beim ersten Zugriff einmal. Text, OCR und Hash nutzen beides gemeinsam.
+    close() gibt nur das geparste Dokument frei; bei Bedarf wird neu geöffnet.
+    """
+
+    def __init__(self, source, name=None, max_bytes=None):
+        size = source_size(source)
+        if max_bytes and size is not None and size > max_bytes:
+            raise FileTooLarge(f"Datei größer als {max_bytes // (1024 * 1024)} MB ({size} Bytes)")
+        self.name = name or getattr(source, "name", None) or (str(source) if isinstance(source, (str, Path)) else None)
+        self.data = _load_bytes(source)
+        if max_bytes and len(self.data) > max_bytes:
+            raise FileTooLarge(f"Datei größer als {max_bytes // (1024 * 1024)} MB ({len(self.data)} Bytes)")
+        self._fitz = None
+        self._sha256 = None
+
+    @property
+    def fitz(self):
+        if self._fitz is None:
+            self._fitz = fitz.open(stream=self.data, filetype="pdf")
+        return self._fitz
+
+    def sha256(self) -> str:
+        if self._sha256 is None:
+            self._sha256 = hashlib.sha256(memoryview(self.data)).hexdigest()
+        return self._sha256
+
+    def page_texts(self, backend=None, max_pages=None, layout=False):
+        """
+        Generator: Text pro Seite; fitz nutzt das offene Dokument, pdfplumber liest dieselben Bytes.
+        layout=True: Seite aus Wort-Koordinaten als eine Zeile "Label: Wert" je Region (immer fitz).
+        """
+        backend = backend or TEXT_BACKEND
+        if layout:
+            return (layout_text(self.regions(i)) for i in range(min(len(self.fitz), max_pages or MAX_PAGES)))
+        if backend == "fitz":
+            return iter_fitz_pages(self.fitz, max_pages or MAX_PAGES)
+        return BACKENDS[backend](io.BytesIO(self.data), max_pages or MAX_PAGES)
+
+    def regions(self, page_no):
+        """Label/Wert-Regionen einer Seite (siehe layout.py)."""
+        return page_regions(self.fitz[page_no], page_no)
+
+    def submit_ocr(self, page_numbers=None, **options):
+        """Ausgewählte Seiten rastern und zur OCR einreichen → ocr_reader.PendingOcr (Tesseract läuft weiter)."""
+        return submit_ocr(self.fitz, page_numbers, **options)
+
+    def close(self):
+        if self._fitz is not None:
+            self._fitz.close()
+            self._fitz = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
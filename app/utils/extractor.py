@@ -0,0 +1,640 @@
+# -*- coding: utf-8 -*-
+"""
+extractor.py – Headless Extraktions-Engine für Rechnungs-PDFs
+- Text beschaffen (PyMuPDF bzw. pdfplumber, OCR-Fallback)
+- NER (trainiertes spaCy-Modell) + Regex-Fallback über FIELD_PATTERNS
+- Beträge/Daten normalisieren
+- optional: bekannte Lieferanten-Layouts ohne Modell auslesen (templates.py)
+Wird von der Streamlit-App, pdf_to_txt.py und Batch-Jobs gemeinsam genutzt.
+"""
+
+import os
+import re
+import json
+import hashlib
+import datetime
+import time
+from concurrent.futures import wait, FIRST_COMPLETED
+from functools import lru_cache
+from pathlib import Path
+
+import spacy
+
+from .pdf_reader import TEXT_BACKEND
+from .document import PdfDocument
+from .patterns import FIELD_PATTERNS, FIELD_MATCHER
+from . import nlp_extractor
+from .metrics import METRICS, stage, observe_stage
+from .templates import default_registry
+
+# --- Projekt-Root (…/PDF_Transfer) ---
+ROOT = Path(__file__).resolve().parents[2]
+MODEL_DIRS = [ROOT / "models" / "ner_model_best", ROOT / "models" / "ner_model"]
+# Eigenes Modell bevorzugen, z. B. den Inferenz-Export (training/export_inference_model.py):
+#   NER_MODEL=models/ner_model_infer
+if os.environ.get("NER_MODEL"):
+    MODEL_DIRS.insert(0, ROOT / os.environ["NER_MODEL"])
+
+NOT_FOUND = "Nicht gefunden"
+NOT_DEFINED = "Nicht definiert"
+DEFAULT_FIELDS = ["Rechnungsnummer", "Datum", "Betrag (€)"]
+
+# nlp.pipe-Tuning (per Umgebungsvariable je Deployment anpassbar)
+NER_BATCH_SIZE = int(os.environ.get("NER_BATCH_SIZE", "16"))
+NER_N_PROCESS = int(os.environ.get("NER_N_PROCESS", "1"))
+
+# Dateien, deren OCR gleichzeitig aussteht, während schon die nächsten gelesen werden (extract_completed)
+FILE_WORKERS = int(os.environ.get("FILE_WORKERS", min(4, os.cpu_count() or 1)))
+
+# NER in überlappenden Fenstern (Zeichen), damit lange PDFs kein riesiges Doc erzeugen.
+# Typische Rechnungen (1–3 Seiten) passen in ein Fenster und laufen unverändert.
+NER_WINDOW_CHARS = int(os.environ.get("NER_WINDOW_CHARS", "4000"))
+NER_WINDOW_OVERLAP = int(os.environ.get("NER_WINDOW_OVERLAP", "200"))
+
+# Layout-Modus: Text aus Wort-Koordinaten als "Label: Wert"-Zeilen, Regex zeilenweise,
+# NER nur über Zeilen, die die Regex nicht schon aufgelöst hat (siehe layout.py)
+TEXT_LAYOUT = os.environ.get("TEXT_LAYOUT") == "1"
+
+# Seiten mit weniger Zeichen in der Textebene gelten als Scan und werden per OCR gelesen
+MIN_PAGE_CHARS = 25
+
+# Bei Änderungen an der Extraktionslogik erhöhen → alte Cache-Einträge werden ignoriert
+CACHE_SCHEMA = 7
+
+# ---------------------- Feld-Mapping & Normalisierung ----------------------
+NER_TO_FIELD = {
+    "RECHNUNGSNUMMER": "Rechnungsnummer",
+    "RECHNUNGSDATUM": "Datum",
+    "LEISTUNGSDATUM": "Leistungsdatum",
+    "ZAHLUNGSZIEL": "Zahlungsziel",
+    "LEISTUNG": "Leistung",
+    "ZWISCHENSUMME_NETTO": "Zwischensumme",
+    "UST_BETRAG": "USt_Betrag",
+    "UST_ID": "UID",
+    "STEUERSATZ": "Steuersatz",
+    "BRUTTOBETRAG": "Betrag (€)",
+    "WÄHRUNG": "Währung",
+    "IBAN": "IBAN",
+    "BIC": "BIC",
+    "FIRMENNAME": "Firmenname",
+    "ADRESSE": "Adresse",
+    "EMAIL": "E-Mail",
+    "RECHNUNGSEMPFÄNGER": "Rechnungsempfänger",
+    "KUNDENNUMMER": "Kundennummer",
+    "BESTELLNUMMER": "Bestellnummer",
+}
+
+NER_FIELDS = set(NER_TO_FIELD.values())
+
+# Felder mit stabilem Format: ein Regex-Treffer gilt, NER läuft dafür nur als Fallback
+REGEX_FIRST_FIELDS = {"IBAN", "BIC", "E-Mail", "UID"}
+
+AMOUNT_FIELDS = {"Betrag (€)", "Zwischensumme", "USt_Betrag"}
+DATE_FIELDS   = {"Datum", "Leistungsdatum", "Zahlungsziel"}
+
+_AMOUNT_RE = re.compile(r"[+-]?\d+(?:\.\d+)?")
+_DATE_RE = re.compile(r"\b(\d{1,2}\.\d{1,2}\.\d{2,4})\b")
+
+def normalize_amount(s: str) -> str:
+    if not s:
+        return s
+    s = s.strip().replace("€", "").replace("EUR", "").replace("eur", "").replace("\u00A0", " ")
+    s = s.replace(" ", "").replace(".", "").replace(",", ".")
+    m = _AMOUNT_RE.search(s)
+    return m.group(0) if m else s
+
+def normalize_date(s: str) -> str:
+    if not s:
+        return s
+    s = s.strip().replace("\u00A0", " ")
+    fmts = ["%d.%m.%Y", "%d.%m.%y", "%Y-%m-%d", "%Y.%m.%d"]
+    for fmt in fmts:
+        try:
+            return datetime.datetime.strptime(s, fmt).date().isoformat()
+        except ValueError:
+            pass
+    m = _DATE_RE.search(s)
+    if m:
+        return normalize_date(m.group(1))
+    return s
+
+def normalize_field(field: str, val: str) -> str:
+    """Normalisiert Beträge/Daten je nach Feldtyp, alles andere bleibt unverändert."""
+    if field in AMOUNT_FIELDS:
+        return normalize_amount(val)
+    if field in DATE_FIELDS:
+        return normalize_date(val)
+    return val
+
+# ---------------------- Modell & Text ----------------------
+def load_ner_model(model_dirs=None):
+    """
+    Lädt das trainierte spaCy-Modell aus models/.
+    Bevorzugt $NER_MODEL (falls gesetzt), dann 'ner_model_best', zuletzt 'ner_model'. None, wenn keins ladbar ist.
+    Prozessweit gecacht: alle Engines/Sessions eines Prozesses teilen sich ein Modell.
+    """
+    return _load_ner_model_cached(tuple(str(d) for d in (model_dirs or MODEL_DIRS)))
+
+@lru_cache(maxsize=None)
+def _load_ner_model_cached(model_dirs):
+    for model_dir in model_dirs:
+        try:
+            return spacy.load(model_dir)
+        except Exception:
+            continue
+    return None
+
+def as_document(pdf) -> PdfDocument:
+    """bytes, Pfad, Datei-Objekt oder PdfDocument → PdfDocument (einmal gelesen, einmal geparst)."""
+    return pdf if isinstance(pdf, PdfDocument) else PdfDocument(pdf)
+
+def model_version(nlp) -> str:
+    """Modellkennung aus meta.json (Name, Version + Hash, damit auch ein Retraining zählt)."""
+    if nlp is None:
+        return "none"
+    meta = nlp.meta
+    digest = hashlib.sha256(json.dumps(meta, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+    return f"{meta.get('name', 'model')}-{meta.get('version', '0')}-{digest[:12]}"
+
+def text_windows(text, size=None, overlap=None):
+    """
+    Text → [(Offset, Fenster)]. Fenster enden an Zeilenumbrüchen und überlappen um etwa
+    `overlap` Zeichen, damit Entitäten an der Grenze in einem Fenster ganz enthalten sind.
+    """
+    size = size or NER_WINDOW_CHARS
+    overlap = NER_WINDOW_OVERLAP if overlap is None else overlap
+    if len(text) <= size:
+        return [(0, text)]
+    windows, start = [], 0
+    while True:
+        end = min(start + size, len(text))
+        if end < len(text):
+            cut = text.rfind("\n", start + overlap + 1, end)
+            if cut != -1:
+                end = cut + 1
+        windows.append((start, text[start:end]))
+        if end >= len(text):
+            return windows
+        # nächstes Fenster an einem Zeilenanfang innerhalb der Überlappung beginnen
+        nxt = text.rfind("\n", start, end - overlap)
+        start = max(nxt + 1 if nxt != -1 else end - overlap, start + 1)
+
+def plan_stages(fields, regex_hits):
+    """
+    Welche teuren Stufen braucht die Auswahl noch? → (Felder für NER, Felder für nlp_extractor).
+    Regex läuft vorher über alle Felder. NER nur für Felder, die das Modell kennt – bei
+    REGEX_FIRST_FIELDS nur ohne Regex-Treffer; Vorname/Nachname/Ort ebenso nur ohne Treffer.
+    Sind beide Listen leer, wird kein Modell angefasst.
+    """
+    ner, persons = [], []
+    for f in fields:
+        if f in nlp_extractor.PERSON_FIELDS:
+            if f not in regex_hits:
+                persons.append(f)
+        elif f in NER_FIELDS and not (f in REGEX_FIRST_FIELDS and f in regex_hits):
+            ner.append(f)
+    return ner, persons
+
+def _all_found(found, fields) -> bool:
+    """True, wenn jedes Feld per FIELD_PATTERNS belegt ist (Felder ohne Pattern → nie vollständig)."""
+    return all(f in found for f in fields)
+
+def read_pdf_text(pdf, fields=None, max_pages=None, layout=False) -> str:
+    """
+    Text aus einem PDF (bytes, Pfad, Datei-Objekt oder PdfDocument), Entscheidung pro Seite:
+    Seiten mit brauchbarer Textebene direkt, nur reine Bildseiten per OCR.
+    Mit fields wird abgebrochen, sobald alle Felder per Regex im bisherigen Text stehen;
+    ausstehende OCR-Seiten entfallen dann ebenfalls.
+    Textebene und OCR arbeiten auf demselben geöffneten Dokument.
+    layout=True liefert pro Textseite eine Zeile je Label/Wert-Region (layout.py).
+    Ein übergebenes PdfDocument bleibt offen; geschlossen wird nur, was hier geöffnet wurde.
+    """
+    doc = as_document(pdf)
+    try:
+        return _read_document_text(doc, list(fields or []), max_pages, layout)
+    finally:
+        if doc is not pdf:
+            doc.close()
+
+def _read_document_text(doc, fields, max_pages, layout):
+    return _finish_text(*_start_text(doc, fields, max_pages, layout))
+
+def _start_text(doc, fields, max_pages, layout):
+    """
+    Textebene lesen und Bildseiten rastern – die ganze PyMuPDF-Arbeit, im aufrufenden Thread.
+    → (Seiten, ausstehende OCR oder None, bisherige OCR-Zeit in s); Tesseract läuft im OCR-Pool weiter.
+    """
+    pages, scanned, found = [], [], set()
+    with stage("text"):
+        for i, t in enumerate(doc.page_texts(max_pages=max_pages, layout=layout)):
+            pages.append(t)
+            if len(t.strip()) < MIN_PAGE_CHARS:
+                scanned.append(i)
+                continue
+            if fields:
+                found.update(FIELD_MATCHER.find_all(t, [f for f in fields if f not in found]))
+                if _all_found(found, fields):
+                    break
+    METRICS.inc("pdf_transfer_pages_total", len(pages) - len(scanned), source="text")
+
+    if scanned and not (fields and _all_found(found, fields)):
+        t0 = time.perf_counter()
+        pending = doc.submit_ocr(scanned)
+        METRICS.inc("pdf_transfer_pages_total", len(scanned), source="ocr")
+        return pages, pending, time.perf_counter() - t0
+    return pages, None, 0.0
+
+def _finish_text(pages, pending, ocr_s):
+    """Auf ausstehende OCR warten und die Seiten zusammensetzen (OCR ersetzt zu kurze Textseiten)."""
+    if pending is not None:
+        t0 = time.perf_counter()
+        ocr_texts = pending.result()
+        observe_stage("ocr", ocr_s + time.perf_counter() - t0)
+        for i, t in ocr_texts.items():
+            if len(t.strip()) > len(pages[i].strip()):
+                pages[i] = t
+    return "\n".join(pages)
+
+# ---------------------- Engine ----------------------
+class InvoiceExtractor:
+    """
+    Wiederverwendbare Extraktions-Engine. Das NER-Modell wird einmal geladen
+    und für alle Aufrufe von extract()/extract_many() genutzt.
+    """
+
+    def __init__(self, nlp=None, fields=None, load_model=True,
+                 batch_size=NER_BATCH_SIZE, n_process=NER_N_PROCESS, cache=None, layout=None,
+                 templates=None):
+        if nlp is None and load_model:
+            nlp = load_ner_model()
+        self.nlp = nlp
+        self.fields = list(fields) if fields else list(DEFAULT_FIELDS)
+        self.batch_size = batch_size
+        self.n_process = n_process
+        # Optionaler Ergebnis-Cache (z. B. utils.cache.DiskLRUCache)
+        self.cache = cache
+        self.layout = TEXT_LAYOUT if layout is None else layout
+        # Lieferanten-Vorlagen (templates.TemplateRegistry); ohne Angabe nur mit TEMPLATES=1, False → aus
+        self.templates = default_registry() if templates is None else (templates or None)
+        self.model_version = model_version(nlp)
+
+    def warmup(self):
+        """Einmal Beispieltext durch die Pipeline schicken, damit der erste echte Aufruf nicht wartet."""
+        if self.nlp:
+            self.nlp("Rechnungsnummer: RE-1 Datum: 01.01.2025 Betrag: 1,00 EUR")
+        return self
+
+    def read_text(self, pdf, fields=None) -> str:
+        return read_pdf_text(pdf, fields, layout=self.layout)
+
+    def run_ner(self, text: str, fields=None) -> dict:
+        """NER-Treffer → {Feld: Wert}; pro Feld zählt der erste Treffer."""
+        fields = self.fields if fields is None else fields
+        if not self.nlp or not fields:
+            return {}
+        return self._windowed_ner(text_windows(text), fields)
+
+    def _windowed_ner(self, windows, fields, first_doc=None) -> dict:
+        """
+        NER Fenster für Fenster; Entitäten werden mit Offset zusammengeführt (doppelte aus der
+        Überlappung zählen einmal). Sobald jedes per NER erkennbare Feld der Auswahl einen
+        Treffer hat, entfallen die restlichen Fenster. first_doc: bereits verarbeitetes erstes Fenster.
+        Zurück kommen nur Werte für die angefragten Felder.
+        """
+        wanted = {f for f in fields if f in NER_TO_FIELD.values()}
+        ents, seen, values = [], set(), {}
+        for n, (offset, window) in enumerate(windows):
+            if n == 0 and first_doc is not None:
+                doc = first_doc
+            else:
+                with stage("ner"):
+                    doc = self.nlp(window)
+            for ent in doc.ents:
+                span = (ent.start_char + offset, ent.end_char + offset, ent.label_)
+                if span not in seen:
+                    seen.add(span)
+                    ents.append((span[0], ent.label_, ent.text))
+            values = self._ner_values((label, txt) for _, label, txt in sorted(ents))
+            if wanted <= values.keys():
+                break
+        return {f: v for f, v in values.items() if f in wanted}
+
+    def _ner_values(self, ents) -> dict:
+        """(Label, Text)-Paare in Dokumentreihenfolge → {Feld: normalisierter Wert}."""
+        ner_values = {}
+        for label, txt in ents:
+            fld = NER_TO_FIELD.get(label)
+            if not fld or fld in ner_values:
+                continue
+            ner_values[fld] = normalize_field(fld, txt.strip())
+        return ner_values
+
+    def person_values(self, text: str, fields) -> dict:
+        """Vorname/Nachname/Ort über nlp_extractor – das Modell wird nur bei Bedarf geladen."""
+        wanted = [f for f in fields if f in nlp_extractor.PERSON_FIELDS]
+        if not wanted:
+            return {}
+        with stage("persons"):
+            found = nlp_extractor.extract_named_entities(text)
+        return {f: found[f] for f in wanted if found.get(f) != NOT_FOUND}
+
+    def plan(self, text: str, fields):
+        """Regex über alle Felder, danach Stufenplan → (Regex-Treffer, NER-Felder, Personenfelder)."""
+        with stage("regex"):
+            if self.layout:
+                # zeilenweise = pro Region; nur was dort fehlt, darf über Zeilengrenzen gesucht werden
+                regex_hits = FIELD_MATCHER.find_in_lines(text.splitlines(), fields)
+                regex_hits.update(FIELD_MATCHER.find_all(text, [f for f in fields if f not in regex_hits]))
+            else:
+                regex_hits = FIELD_MATCHER.find_all(text, fields)
+        ner_fields, person_fields = plan_stages(fields, regex_hits)
+        if not ner_fields:
+            METRICS.inc("pdf_transfer_ner_skipped_total")
+        return regex_hits, ner_fields, person_fields
+
+    def ner_text(self, text: str, regex_hits, ner_fields) -> str:
+        """
+        Layout-Modus: NER sieht nur Zeilen (= Regionen), in denen nicht schon ein Regex-Treffer
+        für ein Feld ohne NER-Bedarf steht. Entfernt wird genau die Zeile des Treffers, nicht
+        jede Zeile, in der der Wert zufällig vorkommt. Sonst unverändert der ganze Text.
+        """
+        resolved = [f for f in regex_hits if f not in ner_fields]
+        if not self.layout or not resolved:
+            return text
+        lines, line_of = text.splitlines(), {}
+        FIELD_MATCHER.find_in_lines(lines, resolved, line_of)
+        drop = set(line_of.values())
+        return "\n".join(line for i, line in enumerate(lines) if i not in drop)
+
+    def match_fields(self, text: str, fields, ner_values=None, regex_hits=None) -> dict:
+        """NER-Werte übernehmen, fehlende Felder per Regex-Fallback aus FIELD_PATTERNS."""
+        ner_values = ner_values or {}
+        if regex_hits is None:
+            with stage("regex"):
+                regex_hits = FIELD_MATCHER.find_all(text, [f for f in fields if not ner_values.get(f)])
+        parsed = {}
+        for field in fields:
+            if field in ner_values and ner_values[field]:
+                parsed[field] = ner_values[field]
+            elif field in regex_hits:
+                parsed[field] = normalize_field(field, regex_hits[field])
+            elif field in FIELD_PATTERNS:
+                parsed[field] = NOT_FOUND
+            else:
+                parsed[field] = NOT_DEFINED
+        return parsed
+
+    # ---------------------- Ergebnis-Cache ----------------------
+    def cache_key(self, doc: PdfDocument, fields) -> str:
+        """SHA-256 des PDFs + Modellversion + Feldauswahl."""
+        return "|".join([
+            doc.sha256(),
+            self.model_version,
+            ",".join(sorted(fields)),
+            "layout" if self.layout else TEXT_BACKEND,
+            f"v{CACHE_SCHEMA}",
+        ])
+
+    def _lookup(self, pdf, fields):
+        """→ (pdf, key, Treffer). Bei aktivem Cache wird das PDF dafür geöffnet und danach weiterverwendet."""
+        if self.cache is None:
+            return pdf, None, None
+        pdf = as_document(pdf)
+        key = self.cache_key(pdf, fields)
+        hit = self.cache.get(key)
+        METRICS.inc("pdf_transfer_cache_total", result="hit" if hit else "miss")
+        return pdf, key, hit
+
+    def _finish(self, text, fields, ner_values, key, regex_hits=None) -> dict:
+        record = self.match_fields(text, fields, ner_values, regex_hits)
+        METRICS.inc("pdf_transfer_documents_total")
+        for v in record.values():
+            METRICS.inc("pdf_transfer_fields_total", result="found" if v not in (NOT_FOUND, NOT_DEFINED) else "missing")
+        if key is not None:
+            self.cache.put(key, {"text": text, "entities": ner_values, "record": record})
+        return record
+
+    @staticmethod
+    def _from_hit(hit, fields) -> dict:
+        return {f: hit["record"][f] for f in fields}
+
+    # ---------------------- Lieferanten-Vorlagen ----------------------
+    def _template(self, pdf, fields):
+        """
+        → (pdf, (Vorlagen-Schlüssel, Regionen, {Feld: Wert}, SHA-256)) bzw. (pdf, None) ohne Registry.
+        """
+        if self.templates is None:
+            return pdf, None
+        pdf = as_document(pdf)
+        with stage("template"):
+            regions = pdf.regions(0) if len(pdf.fitz) else []
+            fp, raw = self.templates.match(regions, fields, self.model_version)
+        known = {f: normalize_field(f, v) if v is not None else NOT_FOUND for f, v in raw.items()}
+        complete = known.keys() >= set(fields)
+        METRICS.inc("pdf_transfer_template_total", result="hit" if complete else "partial" if known else "miss")
+        return pdf, (fp, regions, known, pdf.sha256())
+
+    @staticmethod
+    def _remaining(fields, tpl):
+        """Felder, die nicht schon aus der Vorlage kommen und die Pipeline noch braucht."""
+        return [f for f in fields if f not in tpl[2]] if tpl else list(fields)
+
+    def _learn(self, tpl, record):
+        """
+        Werte aus NER/Regex (nicht aus der Vorlage selbst) als Feldpositionen lernen.
+        "Nicht gefunden" wird nur mit geladenem Modell gelernt – ohne NER ist das kein Befund.
+        """
+        if tpl is None:
+            return
+        fp, regions, known, doc_id = tpl
+        found = {f: None if v == NOT_FOUND else v for f, v in record.items()
+                 if f not in known and v != NOT_DEFINED and (self.nlp is not None or v != NOT_FOUND)}
+        n = self.templates.learn(fp, regions, found, normalize_field, doc_id)
+        if n:
+            METRICS.inc("pdf_transfer_template_fields_learned_total", n)
+
+    # ---------------------- Extraktion ----------------------
+    def extract(self, pdf, fields=None) -> dict:
+        """
+        Ein PDF (bytes, Pfad, Datei-Objekt oder PdfDocument) → {Feld: Wert}.
+        Ein übergebenes PdfDocument bleibt offen; geschlossen wird nur, was hier geöffnet wurde.
+        """
+        fields = self.fields if fields is None else fields
+        doc = as_document(pdf)
+        try:
+            _, key, hit = self._lookup(doc, fields)
+            if hit:
+                return self._from_hit(hit, fields)
+            _, tpl = self._template(doc, fields)
+            rest = self._remaining(fields, tpl)
+            text = self.read_text(doc, rest) if rest or tpl is None else ""
+        finally:
+            if doc is not pdf:
+                doc.close()
+        regex_hits, ner_fields, person_fields = self.plan(text, rest)
+        ner_values = {**self.person_values(text, person_fields),
+                      **self.run_ner(self.ner_text(text, regex_hits, ner_fields), ner_fields),
+                      **(tpl[2] if tpl else {})}
+        record = self._finish(text, fields, ner_values, key, regex_hits)
+        self._learn(tpl, record)
+        return record
+
+    def _prepare(self, pdf, fields, tag=None):
+        """Cache und Vorlagen prüfen, sonst Text beschaffen → (Text, (tag, key, Treffer, Vorlage))."""
+        pages, ctx, pending, ocr_s = self._start(pdf, fields, tag)
+        return _finish_text(pages, pending, ocr_s), ctx
+
+    def _start(self, pdf, fields, tag=None):
+        """
+        Alle PyMuPDF-Arbeit eines PDFs (Cache-Hash, Vorlage, Textebene, Rastern) im aufrufenden
+        Thread → (Seiten, (tag, key, Treffer, Vorlage), ausstehende OCR, OCR-Zeit); weiter mit _finish_text.
+        """
+        doc = as_document(pdf)
+        try:
+            _, key, hit = self._lookup(doc, fields)
+            # Cache-Treffer laufen mit leerem Text mit, damit Zuordnung und Reihenfolge erhalten bleiben
+            if hit:
+                return [], (tag, key, hit, None), None, 0.0
+            _, tpl = self._template(doc, fields)
+            rest = self._remaining(fields, tpl)
+            if not rest and tpl is not None:
+                return [], (tag, key, None, tpl), None, 0.0
+            pages, pending, ocr_s = _start_text(doc, rest, None, self.layout)
+        finally:
+            if doc is not pdf:
+                doc.close()  # die Pixmaps für die OCR leben unabhängig vom Dokument weiter
+        return pages, (tag, key, None, tpl), pending, ocr_s
+
+    def _records(self, prepared, fields, batch_size=None, n_process=None, errors=False):
+        """
+        (Text, (tag, key, Treffer, Vorlage))-Strom → (tag, Datensatz); NER gebündelt über nlp.pipe.
+        Ein Treffer kann auch eine Exception sein (Datei schon beim Lesen gescheitert) und wird
+        dann durchgereicht. errors=True: Fehler eines Dokuments → (tag, Exception), der Rest läuft weiter.
+        """
+
+        def planned():
+            for text, (tag, key, hit, tpl) in prepared:
+                if hit:
+                    yield "", (tag, key, hit, text, None)
+                    continue
+                regex_hits, ner_fields, person_fields = self.plan(text, self._remaining(fields, tpl))
+                # Nur das erste Fenster geht gebündelt durch nlp.pipe (bei typischen Rechnungen der
+                # ganze Text); ohne NER-Bedarf läuft ein leerer Text mit, damit die Reihenfolge bleibt
+                windows = text_windows(self.ner_text(text, regex_hits, ner_fields)) if ner_fields and self.nlp else [(0, "")]
+                yield windows[0][1], (tag, key, hit, text, (regex_hits, ner_fields, person_fields, windows, tpl))
+
+        if self.nlp:
+            docs = self._timed_pipe(
+                planned(),
+                batch_size=batch_size or self.batch_size,
+                n_process=n_process or self.n_process,
+            )
+        else:
+            docs = ((None, ctx) for _, ctx in planned())
+        # nlp.pipe erhält die Reihenfolge
+        for doc, (tag, key, hit, text, plan) in docs:
+            if isinstance(hit, Exception):
+                yield tag, hit
+                continue
+            if hit:
+                yield tag, self._from_hit(hit, fields)
+                continue
+            try:
+                regex_hits, ner_fields, person_fields, windows, tpl = plan
+                ner_values = self._windowed_ner(windows, ner_fields, first_doc=doc) if ner_fields and doc is not None else {}
+                ner_values = {**self.person_values(text, person_fields), **ner_values, **(tpl[2] if tpl else {})}
+                record = self._finish(text, fields, ner_values, key, regex_hits)
+                self._learn(tpl, record)
+            except Exception as e:
+                if not errors:
+                    raise
+                METRICS.inc("pdf_transfer_documents_failed_total")
+                record = e
+            yield tag, record
+
+    def _timed_pipe(self, prepared, batch_size, n_process):
+        """
+        nlp.pipe(as_tuples=True) mit NER-Zeitmessung je Dokument. nlp.pipe zieht die Eingaben
+        lazy; die Zeit für Text/OCR im vorgelagerten Generator wird herausgerechnet.
+        """
+        upstream = [0.0]
+
+        def feed():
+            it = iter(prepared)
+            while True:
+                t0 = time.perf_counter()
+                try:
+                    item = next(it)
+                except StopIteration:
+                    return
+                finally:
+                    upstream[0] += time.perf_counter() - t0
+                yield item
+
+        docs = iter(self.nlp.pipe(feed(), as_tuples=True, batch_size=batch_size, n_process=n_process))
+        while True:
+            t0, before = time.perf_counter(), upstream[0]
+            try:
+                item = next(docs)
+            except StopIteration:
+                return
+            observe_stage("ner", time.perf_counter() - t0 - (upstream[0] - before))
+            yield item
+
+    def extract_many(self, pdfs, fields=None, batch_size=None, n_process=None):
+        """
+        Generator: ein Datensatz pro PDF, in Eingabereihenfolge.
+        Die Texte laufen gebündelt durch nlp.pipe statt einzeln durch nlp(text).
+        """
+        fields = self.fields if fields is None else fields
+        prepared = (self._prepare(pdf, fields) for pdf in pdfs)
+        for _, record in self._records(prepared, fields, batch_size, n_process):
+            yield record
+
+    def extract_completed(self, pdfs, fields=None, workers=None, batch_size=None):
+        """
+        Generator: (Index, Datensatz) in Fertigstellungsreihenfolge; scheitert eine Datei,
+        kommt (Index, Exception) und die übrigen laufen weiter.
+        PyMuPDF ist nicht thread-sicher: Öffnen, Textebene und Rastern laufen nacheinander in
+        diesem Thread, parallel läuft nur Tesseract im OCR-Pool. Während höchstens `workers`
+        Dokumente auf ihre OCR warten, werden schon die nächsten gelesen. nlp.pipe sammelt erst
+        batch_size Texte, bevor es das erste Ergebnis liefert – standardmäßig 1, damit jede
+        Datei sofort erscheint (NER pro Rechnung ist billig gegenüber der OCR).
+        """
+        fields = self.fields if fields is None else fields
+        workers = workers or FILE_WORKERS
+        prepared = self._prepare_overlapped(pdfs, fields, workers)
+        yield from self._records(prepared, fields, batch_size or 1, n_process=1, errors=True)
+
+    def _prepare_overlapped(self, pdfs, fields, workers):
+        """(Text, ctx)-Strom für extract_completed; Fehler einer Datei laufen als Exception im Treffer-Feld mit."""
+        waiting = []  # [(Seiten, ctx, ausstehende OCR, OCR-Zeit)]
+
+        def failed(tag, e):
+            METRICS.inc("pdf_transfer_documents_failed_total")
+            return "", (tag, None, e, None)
+
+        def ready(block):
+            if block:
+                wait([f for _, _, pending, _ in waiting for f in pending.futures], return_when=FIRST_COMPLETED)
+            for item in [w for w in waiting if w[2].done()]:
+                waiting.remove(item)
+                pages, ctx, pending, ocr_s = item
+                try:
+                    yield _finish_text(pages, pending, ocr_s), ctx
+                except Exception as e:
+                    yield failed(ctx[0], e)
+
+        for tag, pdf in enumerate(pdfs):
+            try:
+                pages, ctx, pending, ocr_s = self._start(pdf, fields, tag)
+            except Exception as e:
+                yield failed(tag, e)
+                continue
+            if pending is None:
+                yield "\n".join(pages), ctx
+            else:
+                waiting.append((pages, ctx, pending, ocr_s))
+            yield from ready(block=len(waiting) >= workers)
+        while waiting:
+            yield from ready(block=True)
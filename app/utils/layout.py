@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+layout.py – layoutbewusste Regionen aus Wort-Koordinaten (PyMuPDF get_text("words"))
+- Wörter → visuelle Zeilen (gleiche Höhe) → Zellen (getrennt durch große horizontale Lücken)
+- Zellen → Label/Wert-Paare: "Label: Wert" in einer Zelle, "Label:" + Nachbarzelle
+  oder abwechselnd Label | Wert | Label | Wert bei Tabellen- und Zweispalten-Layouts
+- layout_text(): eine Zeile "Label: Wert" pro Paar, damit Regex und NER Label und Wert
+  zusammen sehen, auch wenn sie im PDF weit auseinander oder rechtsbündig stehen
+"""
+
+import os
+
+# Horizontale Lücke (pt), ab der zwei Wörter zu verschiedenen Zellen gehören
+LAYOUT_CELL_GAP = float(os.environ.get("LAYOUT_CELL_GAP", "8"))
+# Anteil der Worthöhe, um den die Zeilenmitten abweichen dürfen
+LINE_TOLERANCE = 0.5
+
+
+class Region:
+    """Label/Wert-Paar oder freistehender Text einer Seite, mit umschließender Box."""
+
+    def __init__(self, page, value, bbox, label=None):
+        self.page = page
+        self.label = label
+        self.value = value
+        self.bbox = bbox  # (x0, y0, x1, y1) in pt
+
+    @property
+    def text(self):
+        return f"{self.label}: {self.value}" if self.label else self.value
+
+    def __repr__(self):
+        return f"Region({self.page}, {self.text!r})"
+
+
+def _union(boxes):
+    return (min(b[0] for b in boxes), min(b[1] for b in boxes),
+            max(b[2] for b in boxes), max(b[3] for b in boxes))
+
+
+def visual_lines(words):
+    """Wörter (x0, y0, x1, y1, text, …) → Zeilen, jeweils von links nach rechts sortiert."""
+    lines = []
+    for w in sorted(words, key=lambda w: ((w[1] + w[3]) / 2, w[0])):
+        mid, height = (w[1] + w[3]) / 2, w[3] - w[1]
+        if lines:
+            last = lines[-1]
+            last_mid = sum((x[1] + x[3]) / 2 for x in last) / len(last)
+            if abs(mid - last_mid) <= LINE_TOLERANCE * height:
+                last.append(w)
+                continue
+        lines.append([w])
+    return [sorted(line, key=lambda w: w[0]) for line in lines]
+
+
+def cells(line, gap=None):
+    """Eine Zeile → [(Text, Box)] je Zelle; neue Zelle bei einer Lücke größer als gap."""
+    gap = LAYOUT_CELL_GAP if gap is None else gap
+    out, current = [], [line[0]]
+    for prev, w in zip(line, line[1:]):
+        if w[0] - prev[2] > gap:
+            out.append(current)
+            current = []
+        current.append(w)
+    out.append(current)
+    return [(" ".join(w[4] for w in c), _union(c)) for c in out]
+
+
+def line_regions(page_no, line_cells):
+    """Zellen einer Zeile → Regionen mit Label, wo es sich erkennen lässt."""
+    regions, i = [], 0
+    # Label | Wert | Label | Wert …: gerade Anzahl Zellen, Werte ohne eigenen Doppelpunkt
+    paired = len(line_cells) >= 2 and len(line_cells) % 2 == 0 and not any(
+        ":" in t for t, _ in line_cells[1::2])
+    while i < len(line_cells):
+        txt, box = line_cells[i]
+        label, sep, value = txt.partition(":")
+        if sep and label.strip() and value.strip():
+            regions.append(Region(page_no, value.strip(), box, label.strip()))
+            i += 1
+        elif (sep or paired) and i + 1 < len(line_cells):
+            nxt, nbox = line_cells[i + 1]
+            regions.append(Region(page_no, nxt, _union([box, nbox]), label.strip()))
+            i += 2
+        else:
+            regions.append(Region(page_no, txt, box))
+            i += 1
+    return regions
+
+
+def page_regions(page, page_no=0):
+    """PyMuPDF-Seite → Regionen in Lesereihenfolge (oben nach unten, links nach rechts)."""
+    words = page.get_text("words")
+    regions = []
+    for line in visual_lines(words):
+        regions.extend(line_regions(page_no, cells(line)))
+    return regions
+
+
+def layout_text(regions):
+    return "\n".join(r.text for r in regions)
@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""
+metrics.py – Zeitmessung pro Pipeline-Stufe, Zähler und Profiling
+- stage("ocr"): misst einen Abschnitt → Histogramm pdf_transfer_stage_seconds{stage="ocr"}
+  und (bei Log-Level DEBUG) eine JSON-Logzeile im Logger "pdf_transfer.metrics"
+- METRICS.render(): Prometheus-Textformat; start_metrics_server() stellt es unter /metrics bereit
+- profile(out): cProfile bzw. pyinstrument (falls installiert) für einen einzelnen Aufruf
+"""
+
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Optional: pyinstrument (Sampling-Profiler, falls installiert)
+try:
+    from pyinstrument import Profiler as _Pyinstrument
+    HAS_PYINSTRUMENT = True
+except Exception:
+    HAS_PYINSTRUMENT = False
+
+log = logging.getLogger("pdf_transfer.metrics")
+
+# Histogramm-Grenzen in Sekunden (von Regex-Treffern bis zu langen OCR-Läufen)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+STAGE_METRIC = "pdf_transfer_stage_seconds"
+
+# Port für den Metrik-Endpunkt der Streamlit-App (leer → aus)
+METRICS_PORT = os.environ.get("METRICS_PORT", "")
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def _fmt_labels(labels, extra=()):
+    items = list(labels) + list(extra)
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+
+class Metrics:
+    """
+    Prozessweite Zähler, Gauges und Histogramme (thread-sicher).
+    drain()/merge() übertragen die Werte aus Worker-Prozessen in den Hauptprozess.
+    """
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}  # key → [Anzahl je Bucket …, Summe, Anzahl]
+
+    def inc(self, name, value=1, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        with self._lock:
+            self.gauges[_key(name, labels)] = value
+
+    def observe(self, name, value, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            h = self.histograms.get(key)
+            if h is None:
+                h = self.histograms[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    h[i] += 1
+                    break
+            h[-2] += value
+            h[-1] += 1
+
+    def drain(self) -> dict:
+        """Zähler und Histogramme abgeben und zurücksetzen (Gauges bleiben lokal)."""
+        with self._lock:
+            snap = {"counters": self.counters, "histograms": self.histograms}
+            self.counters, self.histograms = {}, {}
+        return snap
+
+    def merge(self, snap):
+        with self._lock:
+            for key, v in snap.get("counters", {}).items():
+                self.counters[key] = self.counters.get(key, 0) + v
+            for key, h in snap.get("histograms", {}).items():
+                mine = self.histograms.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+                for i, v in enumerate(h):
+                    mine[i] += v
+
+    def render(self) -> str:
+        """Alle Werte im Prometheus-Textformat."""
+        with self._lock:
+            counters, gauges = dict(self.counters), dict(self.gauges)
+            histograms = {k: list(v) for k, v in self.histograms.items()}
+        lines, typed = [], set()
+
+        def type_line(name, kind):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), v in sorted(counters.items()):
+            type_line(name, "counter")
+            lines.append(f"{name}{_fmt_labels(labels)} {v}")
+        for (name, labels), v in sorted(gauges.items()):
+            type_line(name, "gauge")
+            lines.append(f"{name}{_fmt_labels(labels)} {v}")
+        for (name, labels), h in sorted(histograms.items()):
+            type_line(name, "histogram")
+            cumulative = 0
+            for bound, n in zip(self.buckets, h):
+                cumulative += n
+                lines.append(f"{name}_bucket{_fmt_labels(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{name}_bucket{_fmt_labels(labels, [('le', '+Inf')])} {h[-1]}")
+            lines.append(f"{name}_sum{_fmt_labels(labels)} {h[-2]:.6f}")
+            lines.append(f"{name}_count{_fmt_labels(labels)} {h[-1]}")
+        return "\n".join(lines) + "\n"
+
+
+METRICS = Metrics()
+
+
+def observe_stage(name, seconds, **labels):
+    """Dauer einer Stufe erfassen und als strukturierte Logzeile ausgeben."""
+    METRICS.observe(STAGE_METRIC, seconds, stage=name, **labels)
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug(json.dumps({"event": "stage", "stage": name, "ms": round(seconds * 1000, 2), **labels},
+                             ensure_ascii=False))
+
+
+@contextmanager
+def stage(name, **labels):
+    """with stage("ner"): … – misst den Block, auch wenn er mit einer Exception endet."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(name, time.perf_counter() - t0, **labels)
+
+
+# ---------------------- Endpunkt ----------------------
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = METRICS.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_metrics_server(port, host="127.0.0.1"):
+    """GET /metrics in einem Hintergrund-Thread bereitstellen → Server-Objekt."""
+    server = ThreadingHTTPServer((host, int(port)), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
+
+
+# ---------------------- Profiling ----------------------
+@contextmanager
+def profile(out=None, tool=None):
+    """
+    Profilt den Block und schreibt das Ergebnis nach out (ohne out → stdout).
+    tool: "cprofile" (Standard) oder "pyinstrument" (falls installiert).
+    cProfile: *.prof → Rohdaten für snakeviz & Co., sonst Top-40 nach kumulierter Zeit.
+    pyinstrument: *.html → interaktive Ansicht, sonst Textbaum.
+    """
+    tool = tool or ("pyinstrument" if HAS_PYINSTRUMENT else "cprofile")
+    if tool == "pyinstrument":
+        if not HAS_PYINSTRUMENT:
+            raise RuntimeError("pyinstrument ist nicht installiert (pip install pyinstrument)")
+        profiler = _Pyinstrument()
+        profiler.start()
+        try:
+            yield
+        finally:
+            profiler.stop()
+            report = profiler.output_html() if out and out.endswith(".html") else profiler.output_text(unicode=True)
+            _write_report(report, out)
+        return
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        if out and out.endswith(".prof"):
+            profiler.dump_stats(out)
+        else:
+            buf = io.StringIO()
+            pstats.Stats(profiler, stream=buf).sort_stats("cumulative").print_stats(40)
+            _write_report(buf.getvalue(), out)
+
+
+def _write_report(report, out):
+    if out:
+        with open(out, "w", encoding="utf-8") as f:
+            f.write(report)
+    else:
+        print(report)
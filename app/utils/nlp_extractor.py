@@ -1,9 +1,20 @@
+from functools import lru_cache
+
 import spacy
 
-nlp = spacy.load("de_core_news_md")
+# Allgemeines deutsches Modell (PER/LOC) – wird erst beim ersten Aufruf geladen
+MODEL_NAME = "de_core_news_md"
+PERSON_FIELDS = ("Vorname", "Nachname", "Ort")
+
+@lru_cache(maxsize=None)
+def get_nlp():
+    """Lädt de_core_news_md einmal pro Prozess; None, wenn das Modell nicht installiert ist."""
+    try:
+        return spacy.load(MODEL_NAME)
+    except Exception:
+        return None
 
 def extract_named_entities(text):
-    doc = nlp(text)
     results = {
         "Vorname": None,
         "Nachname": None,
@@ -11,6 +22,11 @@ def extract_named_entities(text):
         "E-Mail": None
     }
 
+    nlp = get_nlp()
+    if nlp is None:
+        return {k: "Nicht gefunden" for k in results}
+
+    doc = nlp(text)
     for ent in doc.ents:
         if ent.label_ == "PER":
             parts = ent.text.split(" ")
@@ -1,15 +1,216 @@
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
 from PIL import Image
 import pytesseract
 import fitz  # PyMuPDF
 
-# Pfad zur Tesseract-Installation (anpassen, falls anders installiert)
-pytesseract.pytesseract.tesseract_cmd = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
-
-def ocr_from_pdf(file_path):
-    text = ""
-    doc = fitz.open(file_path)
-    for page in doc:
-        pix = page.get_pixmap()
-        img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-        text += pytesseract.image_to_string(img, lang="deu")  # OCR in Deutsch
-    return text
+# Jede Tesseract-Instanz nur ein OpenMP-Thread (parallel wird über OCR_WORKERS). Muss vor dem
+# Import von tesserocr gesetzt sein: die OpenMP-Runtime liest das Limit, wenn libtesseract geladen wird
+os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+
+# Optional: tesserocr (Tesseract-API im Prozess, falls installiert)
+try:
+    import tesserocr
+    HAS_TESSEROCR = True
+except Exception:
+    HAS_TESSEROCR = False
+
+from .pdf_reader import open_fitz
+from .metrics import METRICS, observe_stage
+from .cache import DiskLRUCache, CACHE_DIR
+
+# Pfad zur Tesseract-Installation (anpassen, falls anders installiert); sonst tesseract aus dem PATH
+WINDOWS_TESSERACT = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
+if os.path.exists(WINDOWS_TESSERACT):
+    pytesseract.pytesseract.tesseract_cmd = WINDOWS_TESSERACT
+
+# OCR-Engine: "tesserocr" hält pro Worker-Thread eine Tesseract-Instanz mit geladenem
+# 'deu' offen und bekommt die Pixel im Speicher; "pytesseract" startet pro Seite einen Prozess.
+OCR_ENGINE = os.environ.get("OCR_ENGINE", "tesserocr" if HAS_TESSEROCR else "pytesseract")
+OCR_LANG = os.environ.get("OCR_LANG", "deu")  # OCR in Deutsch
+
+# Anzahl paralleler OCR-Seiten (prozessweit geteilter Pool). Beide Engines geben den GIL
+# während der Erkennung frei, Threads reichen also (OMP_THREAD_LIMIT siehe oben).
+OCR_WORKERS = int(os.environ.get("OCR_WORKERS", os.cpu_count() or 1))
+
+# Rasterung: Tesseract arbeitet am besten um 300 dpi; Graustufen spart 2/3 der Pixeldaten.
+OCR_DPI = int(os.environ.get("OCR_DPI", "300"))
+OCR_GRAYSCALE = os.environ.get("OCR_GRAYSCALE", "1") != "0"
+
+# Seiten-Cache: OCR-Text je gerasterter Seite (Hash der Pixel + DPI/Sprache/Engine).
+# Speichert erkannten Text auf der Platte → nur mit OCR_CACHE=1 bzw. enable_ocr_cache().
+OCR_CACHE = os.environ.get("OCR_CACHE") == "1"
+OCR_CACHE_MAX_MB = int(os.environ.get("OCR_CACHE_MAX_MB", "64"))
+_cache = None
+_cache_lock = threading.Lock()
+
+def enable_ocr_cache(enabled=True):
+    global OCR_CACHE
+    OCR_CACHE = enabled
+
+def ocr_cache():
+    """Prozessweiter DiskLRUCache für Seitentexte; None, wenn abgeschaltet."""
+    global _cache
+    if not OCR_CACHE:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = DiskLRUCache(CACHE_DIR / "ocr.sqlite", max_bytes=OCR_CACHE_MAX_MB * 1024 * 1024)
+    return _cache
+
+def page_key(pix, dpi):
+    """Schlüssel einer gerasterten Seite; Graustufen/Ausschnitt stecken bereits in den Pixeln."""
+    digest = hashlib.blake2b(pix.samples_mv, digest_size=16).hexdigest()
+    return f"{digest}|{pix.width}x{pix.height}x{pix.n}|{dpi}|{OCR_LANG}|{OCR_ENGINE}"
+
+def _page_clip(page, clip):
+    """Relativer Ausschnitt (x0, y0, x1, y1 als Anteil 0–1 der Seite) → fitz.Rect."""
+    if clip is None:
+        return None
+    r = page.rect
+    x0, y0, x1, y1 = clip
+    return fitz.Rect(r.x0 + x0 * r.width, r.y0 + y0 * r.height,
+                     r.x0 + x1 * r.width, r.y0 + y1 * r.height)
+
+def render_page(page, dpi=None, grayscale=None, clip=None):
+    """Seite rastern; clip begrenzt auf eine Region of Interest (relativ, siehe _page_clip)."""
+    grayscale = OCR_GRAYSCALE if grayscale is None else grayscale
+    return page.get_pixmap(
+        dpi=dpi or OCR_DPI,
+        colorspace=fitz.csGRAY if grayscale else fitz.csRGB,
+        clip=_page_clip(page, clip),
+        alpha=False,
+    )
+
+def pixmap_to_image(pix):
+    """PIL-Image direkt auf dem Pixmap-Puffer (keine Kopie wie bei frombytes); pix muss solange leben."""
+    mode = "L" if pix.n == 1 else "RGB"
+    return Image.frombuffer(mode, (pix.width, pix.height), pix.samples_mv, "raw", mode, pix.stride, 1)
+
+_local = threading.local()
+
+def _tesserocr_api():
+    """Eine Tesseract-Instanz pro Thread, beim ersten Aufruf geladen und danach wiederverwendet."""
+    api = getattr(_local, "api", None)
+    if api is None:
+        api = _local.api = tesserocr.PyTessBaseAPI(lang=OCR_LANG)
+    return api
+
+@lru_cache(maxsize=None)
+def _ocr_pool(workers):
+    """Langlebiger Thread-Pool, damit die Tesseract-Instanzen der Threads erhalten bleiben."""
+    return ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ocr")
+
+def _pixel_buffer(pix):
+    """
+    Im Render-Thread: Pixmap → (Puffer, Breite, Höhe, Kanäle, Stride), damit der OCR-Thread
+    keine PyMuPDF-Funktion mehr aufruft. tesserocr braucht bytes: pix.samples ist eine Kopie,
+    und SetImageBytes kopiert sie noch einmal in Tesseracts eigenes Bild. pytesseract liest den
+    Pixmap-Speicher direkt (PIL frombuffer) und schreibt ihn für den tesseract-Prozess als Datei.
+    """
+    buf = pix.samples if OCR_ENGINE == "tesserocr" else pix.samples_mv
+    return buf, pix.width, pix.height, pix.n, pix.stride
+
+def _ocr_buffer(image, dpi):
+    t0 = time.perf_counter()
+    buf, width, height, n, stride = image
+    if OCR_ENGINE == "tesserocr":
+        api = _tesserocr_api()
+        api.SetImageBytes(buf, width, height, n, stride)
+        api.SetSourceResolution(dpi)
+        text = api.GetUTF8Text()
+        api.Clear()
+    else:
+        mode = "L" if n == 1 else "RGB"
+        img = Image.frombuffer(mode, (width, height), buf, "raw", mode, stride, 1)
+        text = pytesseract.image_to_string(img, lang=OCR_LANG)
+    return text, (time.perf_counter() - t0) * 1000
+
+class PendingOcr:
+    """
+    Eingereichte OCR eines Dokuments: gerastert ist bereits, Tesseract läuft im OCR-Pool.
+    futures → für concurrent.futures.wait, done() prüft ohne zu warten, result() wartet →
+    {Seitennummer: Text}. Die Pixmaps bleiben bis result() hier, damit sie im Render-Thread
+    (und nicht in einem OCR-Thread) freigegeben werden.
+    """
+
+    def __init__(self, numbers, dpi, cache, stats):
+        self.numbers = numbers
+        self.dpi = dpi
+        self.cache = cache
+        self.stats = stats
+        self.pending, self.results, self.keys, self.raster_ms = {}, {}, {}, {}
+        self._pixmaps = []
+
+    @property
+    def futures(self):
+        return set(self.pending.values())
+
+    def done(self):
+        return all(f.done() for f in self.pending.values())
+
+    def result(self):
+        for i in self.numbers:
+            ocr_ms = 0.0
+            if i in self.pending:
+                self.results[i], ocr_ms = self.pending[i].result()
+                observe_stage("ocr_tesseract", ocr_ms / 1000, engine=OCR_ENGINE)
+                if self.cache is not None:
+                    self.cache.put(self.keys[i], {"text": self.results[i]})
+            observe_stage("ocr_raster", self.raster_ms[i] / 1000)
+            if self.stats is not None:
+                self.stats.append({"page": i, "dpi": self.dpi, "raster_ms": round(self.raster_ms[i], 1),
+                                   "ocr_ms": round(ocr_ms, 1), "cached": i not in self.pending})
+        self.pending, self._pixmaps = {}, []
+        return {i: self.results[i] for i in self.numbers}
+
+def submit_ocr(file_path, page_numbers=None, workers=None, dpi=None, grayscale=None, clip=None, stats=None):
+    """
+    Seiten rastern (im aufrufenden Thread – PyMuPDF ist nicht thread-sicher) und die Erkennung
+    im prozessweiten OCR-Pool einreichen → PendingOcr. So kann der Aufrufer weitere Dokumente
+    lesen, während Tesseract arbeitet. Mit OCR-Cache kostet eine bekannte Seite nur Rastern + Hash.
+    """
+    doc = open_fitz(file_path)
+    numbers = list(range(len(doc)) if page_numbers is None else page_numbers)
+    pool = _ocr_pool(max(1, workers or OCR_WORKERS))
+    dpi = dpi or OCR_DPI
+    job = PendingOcr(numbers, dpi, ocr_cache(), stats)
+
+    seen = {}
+    for i in numbers:
+        t0 = time.perf_counter()
+        pix = render_page(doc[i], dpi=dpi, grayscale=grayscale, clip=clip)
+        job.raster_ms[i] = (time.perf_counter() - t0) * 1000
+        if job.cache is not None:
+            job.keys[i] = page_key(pix, dpi)
+            hit = job.cache.get(job.keys[i])
+            METRICS.inc("pdf_transfer_ocr_cache_total", result="hit" if hit else "miss")
+            if hit:
+                job.results[i] = hit["text"]
+                continue
+            if job.keys[i] in seen:  # gleiche Seite mehrfach im Dokument → einmal erkennen
+                job.pending[i] = seen[job.keys[i]]
+                continue
+        job._pixmaps.append(pix)
+        job.pending[i] = pool.submit(_ocr_buffer, _pixel_buffer(pix), dpi)
+        if job.cache is not None:
+            seen[job.keys[i]] = job.pending[i]
+    return job
+
+def ocr_pages(file_path, page_numbers=None, workers=None, dpi=None, grayscale=None, clip=None, stats=None):
+    """
+    OCR nur für die angegebenen Seiten (0-basiert) → {Seitennummer: Text}, in Seitenreihenfolge.
+    Gerastert wird nacheinander (PyMuPDF ist nicht thread-sicher), erkannt parallel im
+    prozessweiten OCR-Pool (auch bei mehreren gleichzeitigen Dokumenten höchstens `workers` Seiten).
+    Mit OCR-Cache kostet eine bereits bekannte Seite nur Rastern + Hash.
+    Ist stats eine Liste, wird pro Seite {"page", "dpi", "raster_ms", "ocr_ms", "cached"} angehängt.
+    """
+    return submit_ocr(file_path, page_numbers, workers, dpi, grayscale, clip, stats).result()
+
+def ocr_from_pdf(file_path, workers=None, **options):
+    return "".join(ocr_pages(file_path, workers=workers, **options).values())
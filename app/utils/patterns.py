@@ -1,3 +1,5 @@
+import re
+
 FIELD_PATTERNS = {
     "Rechnungsnummer": r"Rechnungsnummer[:\s]*([A-Z0-9\-\/]+)",
     "Rechnungsdatum": r"(?:Rechnungs-?datum|Datum)[:\s]*(\d{2}\.\d{2}\.\d{4})",
@@ -35,3 +37,52 @@ FIELD_PATTERNS = {
     "Skonto": r"Skonto[:\s]*(?:EUR|€)?\s*([\d.,]+)",
     "Zahlbar bis": r"(?:Zahlbar bis|Fälligkeitsdatum)[:\s]*(\d{2}\.\d{2}\.\d{4})"
 }
+
+
+# ---------------------- Kompilierter Matcher ----------------------
+class FieldMatcher:
+    """
+    Alle Patterns einmal beim Import kompiliert; find_all() liefert alle Feldtreffer
+    eines Textes auf einmal. Identische Patterns (z. B. Datum/Rechnungsdatum) werden
+    pro Text nur einmal gesucht. Ergebnis identisch zu re.search je Feld.
+    """
+
+    def __init__(self, patterns):
+        self.patterns = {f: re.compile(p) for f, p in patterns.items()}
+
+    def search(self, text, fields=None):
+        """→ {Feld: Match} für die gewünschten Felder (alle, wenn fields None), nur Treffer."""
+        hits, seen = {}, {}
+        for f in self.patterns if fields is None else fields:
+            rx = self.patterns.get(f)
+            if rx is None:
+                continue
+            if rx.pattern not in seen:
+                seen[rx.pattern] = rx.search(text)
+            if seen[rx.pattern]:
+                hits[f] = seen[rx.pattern]
+        return hits
+
+    def find_all(self, text, fields=None):
+        """→ {Feld: Wert aus Gruppe 1} für alle gefundenen Felder."""
+        return {f: m.group(1) for f, m in self.search(text, fields).items()}
+
+    def find_in_lines(self, lines, fields=None, line_of=None):
+        """
+        Wie find_all, aber Zeile für Zeile: kein Treffer überspannt eine Zeilengrenze, die erste Zeile gewinnt.
+        line_of (dict): erhält je gefundenem Feld den Index der Zeile, in der der Treffer steht.
+        """
+        wanted = list(self.patterns if fields is None else fields)
+        hits = {}
+        for i, line in enumerate(lines):
+            rest = [f for f in wanted if f not in hits]
+            if not rest:
+                break
+            found = self.find_all(line, rest)
+            hits.update(found)
+            if line_of is not None:
+                line_of.update(dict.fromkeys(found, i))
+        return hits
+
+
+FIELD_MATCHER = FieldMatcher(FIELD_PATTERNS)
@@ -1,5 +1,65 @@
+import os
+
+import fitz  # PyMuPDF
 import pdfplumber
 
-def extract_text_from_pdf(file_path):
+from .layout import visual_lines
+
+# Text-Backend: "fitz" (PyMuPDF, schnell, Standard) oder "pdfplumber" (Referenz der Trainingstexte)
+TEXT_BACKEND = os.environ.get("TEXT_BACKEND", "fitz")
+
+def open_fitz(file_path):
+    """PyMuPDF-Dokument aus Pfad, bytes oder Datei-Objekt öffnen; ein offenes Dokument wird durchgereicht."""
+    if isinstance(file_path, fitz.Document):
+        return file_path
+    if isinstance(file_path, (bytes, bytearray, memoryview)):
+        return fitz.open(stream=bytes(file_path), filetype="pdf")
+    if hasattr(file_path, "read"):
+        return fitz.open(stream=file_path.read(), filetype="pdf")
+    return fitz.open(file_path)
+
+# Invoices brauchen selten mehr als die ersten Seiten; lange Anhänge werden abgeschnitten
+MAX_PAGES = int(os.environ.get("MAX_PAGES", "10"))
+# Text-Export (pdf_to_txt.py, Trainingstexte) braucht ganze Dokumente
+EXPORT_MAX_PAGES = int(os.environ.get("EXPORT_MAX_PAGES", "1000"))
+
+def iter_fitz_pages(doc, max_pages):
+    """
+    Text pro Seite aus einem bereits geöffneten PyMuPDF-Dokument.
+    Zeilen entstehen aus den Wort-Boxen (layout.visual_lines), Wörter einer Zeile getrennt durch ein
+    Leerzeichen – wie bei pdfplumber und unabhängig davon, wie die PyMuPDF-Version Blöcke und
+    Zeilen bildet (get_text("text", sort=True) trennt je nach Version Label und Wert oder füllt
+    Zeilen mit Leerzeichen auf).
+    """
+    for i, page in enumerate(doc):
+        if i >= max_pages:
+            break
+        yield "\n".join(" ".join(w[4] for w in line) for line in visual_lines(page.get_text("words")))
+
+def _iter_fitz(file_path, max_pages):
+    with open_fitz(file_path) as doc:
+        yield from iter_fitz_pages(doc, max_pages)
+
+def _iter_pdfplumber(file_path, max_pages):
     with pdfplumber.open(file_path) as pdf:
-        return "\n".join([page.extract_text() for page in pdf.pages])
+        for page in pdf.pages[:max_pages]:
+            yield page.extract_text() or ""
+            page.close()  # Zeichen-/Layout-Cache der Seite freigeben
+
+BACKENDS = {
+    "fitz": _iter_fitz,
+    "pdfplumber": _iter_pdfplumber,
+}
+
+def iter_page_texts(file_path, backend=None, max_pages=None):
+    """
+    Generator: Text pro Seite, höchstens max_pages Seiten (Standard MAX_PAGES).
+    Seiten ohne Textebene liefern "" statt None; wer früh abbricht, spart den Rest.
+    """
+    return BACKENDS[backend or TEXT_BACKEND](file_path, max_pages or MAX_PAGES)
+
+def extract_page_texts(file_path, backend=None, max_pages=None):
+    return list(iter_page_texts(file_path, backend, max_pages))
+
+def extract_text_from_pdf(file_path, backend=None, max_pages=None):
+    return "\n".join(iter_page_texts(file_path, backend, max_pages))
@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+"""
+sinks.py – inkrementelle Ausgabe von Extraktionsergebnissen (JSONL, CSV, XLSX, Parquet)
+Jeder Datensatz wird sofort geschrieben, damit lange Läufe abbrechen und
+später fortgesetzt werden können (done_keys()). Zeilen mit Fehler zählen nicht als
+erledigt; bei einer Wiederholung gilt die letzte Zeile je Datei, close() entfernt die älteren.
+"""
+
+import csv
+import json
+import os
+from pathlib import Path
+
+# Optional: Parquet (pyarrow, falls installiert)
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    HAS_PARQUET = True
+except Exception:
+    HAS_PARQUET = False
+
+KEY_COLUMN = "Datei"
+ERROR_COLUMN = "Fehler"
+
+
+def read_jsonl(path):
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def _done(rows, key):
+    """Schlüssel erfolgreich verarbeiteter Zeilen; fehlgeschlagene werden erneut versucht."""
+    return {r.get(key) for r in rows if not r.get(ERROR_COLUMN)}
+
+
+def latest_per_key(records, key=KEY_COLUMN):
+    """
+    Bei wiederholten Dateien nur die letzte Zeile, in Reihenfolge des ersten Auftretens.
+    Zeilen ohne Schlüssel (z. B. Session-Ergebnisse der App) bleiben alle erhalten.
+    """
+    latest = {}
+    for i, r in enumerate(records):
+        k = r.get(key)
+        latest[k if k else (None, i)] = r
+    return latest.values()
+
+
+def _replace_if_shorter(path, rows, write):
+    """rows auf die letzte Zeile je Datei verdichten; nur bei Wiederholungen neu (atomar) schreiben."""
+    rows = list(rows)
+    latest = list(latest_per_key(rows))
+    if len(latest) == len(rows):
+        return
+    tmp = Path(str(path) + ".tmp")
+    write(tmp, latest)
+    os.replace(tmp, path)
+
+
+class JsonlSink:
+    """Eine JSON-Zeile pro Datensatz, angehängt an eine bestehende Datei."""
+
+    def __init__(self, path, columns=None):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.columns = columns
+        self._f = open(self.path, "a", encoding="utf-8")
+        self._written = 0
+
+    def done_keys(self, key=KEY_COLUMN):
+        return _done(self.records(), key)
+
+    def records(self):
+        return read_jsonl(self.path) if self.path.exists() else iter(())
+
+    def write(self, record):
+        self._f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._f.flush()
+        self._written += 1
+
+    def close(self):
+        self._f.close()
+        # erneut versuchte Dateien: alte Fehlerzeile entfernen
+        if self._written:
+            _replace_if_shorter(self.path, self.records(), self._write_jsonl)
+
+    @staticmethod
+    def _write_jsonl(path, rows):
+        with open(path, "w", encoding="utf-8") as f:
+            for r in rows:
+                f.write(json.dumps(r, ensure_ascii=False) + "\n")
+
+
+class CsvSink:
+    """
+    CSV mit fester Spaltenliste; Header nur, wenn die Datei neu ist. An eine bestehende
+    Datei mit anderen Spalten (z. B. andere --fields) wird nicht angehängt.
+    """
+
+    def __init__(self, path, columns):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.columns = list(columns)
+        new_file = not self.path.exists() or self.path.stat().st_size == 0
+        if not new_file:
+            with open(self.path, "r", encoding="utf-8", newline="") as f:
+                header = next(csv.reader(f), [])
+            if header != self.columns:
+                raise ValueError(f"{self.path} hat andere Spalten ({', '.join(header)}) – "
+                                 f"neue Ausgabedatei wählen oder dieselben Felder verwenden")
+        self._f = open(self.path, "a", encoding="utf-8", newline="")
+        self._writer = csv.DictWriter(self._f, fieldnames=self.columns, restval="", extrasaction="ignore")
+        if new_file:
+            self._writer.writeheader()
+        self._written = 0
+
+    def done_keys(self, key=KEY_COLUMN):
+        with open(self.path, "r", encoding="utf-8", newline="") as f:
+            return _done(csv.DictReader(f), key)
+
+    def write(self, record):
+        self._writer.writerow(record)
+        self._f.flush()
+        self._written += 1
+
+    def close(self):
+        self._f.close()
+        # erneut versuchte Dateien: alte Fehlerzeile entfernen
+        if self._written:
+            with open(self.path, "r", encoding="utf-8", newline="") as f:
+                _replace_if_shorter(self.path, csv.DictReader(f), self._write_csv)
+
+    def _write_csv(self, path, rows):
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=self.columns, restval="", extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(rows)
+
+
+def write_excel(records, path, columns):
+    """Excel im write-only-Modus von openpyxl: Zeilen werden gestreamt statt im Speicher gehalten."""
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(list(columns))
+    for r in records:
+        ws.append([r.get(c, "") for c in columns])
+    wb.save(path)
+
+
+class XlsxSink(JsonlSink):
+    """
+    XLSX lässt sich nicht anhängen: Datensätze gehen in ein JSONL-Journal neben der
+    Zieldatei (<name>.xlsx.jsonl), close() erzeugt daraus die Arbeitsmappe.
+    """
+
+    def __init__(self, path, columns):
+        self.xlsx_path = Path(path)
+        super().__init__(str(self.xlsx_path) + ".jsonl", columns)
+
+    def close(self):
+        super().close()
+        write_excel(latest_per_key(self.records()), self.xlsx_path, self.columns)
+
+
+class ParquetSink(JsonlSink):
+    """
+    Parquet lässt sich ebenfalls nicht anhängen: wie bei XlsxSink gehen Datensätze sofort in ein
+    JSONL-Journal (<name>.parquet.jsonl), das Abbrüche übersteht und done_keys() liefert.
+    close() schreibt daraus die Parquet-Datei, eine Row-Group je row_group_size Datensätzen
+    (alle Spalten als Text). Eine bestehende Parquet-Datei ohne Journal wird übernommen.
+    """
+
+    def __init__(self, path, columns, row_group_size=1000):
+        if not HAS_PARQUET:
+            raise RuntimeError("Parquet-Ausgabe benötigt pyarrow (pip install pyarrow)")
+        self.parquet_path = Path(path)
+        self.row_group_size = row_group_size
+        journal = Path(str(self.parquet_path) + ".jsonl")
+        adopt = self.parquet_path.exists() and not (journal.exists() and journal.stat().st_size)
+        super().__init__(journal, list(columns))
+        self.schema = pa.schema([(c, pa.string()) for c in self.columns])
+        if adopt:
+            for r in pq.read_table(self.parquet_path).to_pylist():
+                self.write(r)
+
+    def _table(self, rows):
+        cols = {c: [None if r.get(c) is None else str(r.get(c)) for r in rows] for c in self.columns}
+        return pa.table(cols, schema=self.schema)
+
+    def close(self):
+        super().close()
+        tmp = str(self.parquet_path) + ".tmp"
+        with pq.ParquetWriter(tmp, self.schema) as writer:
+            rows = []
+            for r in latest_per_key(self.records()):
+                rows.append(r)
+                if len(rows) >= self.row_group_size:
+                    writer.write_table(self._table(rows))
+                    rows = []
+            if rows:
+                writer.write_table(self._table(rows))
+        os.replace(tmp, self.parquet_path)
+
+
+SINKS = {
+    ".jsonl": JsonlSink,
+    ".csv": CsvSink,
+    ".xlsx": XlsxSink,
+    ".parquet": ParquetSink,
+}
+
+
+def open_sink(path, columns, fmt=None):
+    """Sink passend zur Dateiendung (oder fmt: 'jsonl', 'csv', 'xlsx', 'parquet')."""
+    ext = "." + fmt.lstrip(".") if fmt else os.path.splitext(str(path))[1].lower()
+    if ext not in SINKS:
+        raise ValueError(f"Unbekanntes Ausgabeformat: {ext} (erlaubt: {', '.join(SINKS)})")
+    return SINKS[ext](path, columns)
@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+"""
+templates.py – wiederkehrende Lieferanten-Layouts erkennen und Felder direkt ablesen
+- Fingerabdruck: Anker-Labels der ersten Seite (layout.py-Regionen) samt Spaltenposition;
+  die Höhe zählt nicht, damit längere Positionslisten die Zuordnung nicht verschieben
+- Pro Feld merkt sich die Vorlage, wo der Wert stand: hinter welchem Anker-Label oder, ohne
+  Label, an welcher Position und mit welchem festen Präfix (z. B. "Re-Nr. ")
+- Gelernt wird aus den Ergebnissen der vollen Pipeline (NER/Regex); eine Position gilt erst,
+  wenn sie an TEMPLATE_CONFIRMATIONS verschiedenen Dokumenten denselben Wert geliefert hat.
+  Ebenso oft nicht gefundene Felder gelten für die Vorlage als fehlend, damit bekannte Layouts
+  die Pipeline ganz überspringen
+- Vorlagen gelten je Modellversion: ein anderes (z. B. neu trainiertes) Modell lernt neu
+- Gespeichert werden nur Labels und Koordinaten, keine Feldwerte (JSON unter CACHE_DIR)
+"""
+
+import atexit
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from pathlib import Path
+
+from .cache import CACHE_DIR
+
+# Nur mit TEMPLATES=1, enable_templates() bzw. InvoiceExtractor(templates=TemplateRegistry(…)) aktiv
+TEMPLATES = os.environ.get("TEMPLATES") == "1"
+TEMPLATE_PATH = Path(os.environ.get("TEMPLATE_PATH", CACHE_DIR / "templates.json"))
+# Übereinstimmende Beobachtungen, bevor eine Feldposition ohne Modell genutzt wird
+TEMPLATE_CONFIRMATIONS = int(os.environ.get("TEMPLATE_CONFIRMATIONS", "2"))
+# Mindestanzahl Anker-Labels für einen Fingerabdruck (weniger → zu unspezifisch)
+TEMPLATE_MIN_ANCHORS = 4
+# Rastergröße (pt) für Spalten- und Positionsvergleiche
+TEMPLATE_GRID = 12.0
+# Gemerkte Dokument-Hashes je Vorlage (dasselbe PDF bestätigt eine Position nur einmal)
+TEMPLATE_SEEN = 200
+# Höchstens alle n Sekunden schreiben; dazwischen Gelerntes sammeln (flush() bzw. Prozessende schreibt den Rest)
+TEMPLATE_SAVE_INTERVAL = float(os.environ.get("TEMPLATE_SAVE_INTERVAL", "10"))
+
+_LABEL_RE = re.compile(r"[^\W\d_][\w .()/-]{0,39}")
+
+
+def anchor_label(label):
+    """Region-Label → Anker ("Re-Nr." → "re-nr"); None für Labels mit Ziffern (eher Inhalt als Layout)."""
+    if not label:
+        return None
+    label = re.sub(r"\s+", " ", label).strip(" .:").lower()
+    return label if _LABEL_RE.fullmatch(label) and not any(c.isdigit() for c in label) else None
+
+
+def _column(region):
+    return round(region.bbox[0] / TEMPLATE_GRID)
+
+
+def fingerprint(regions):
+    """Regionen der ersten Seite → Hash über (Anker, Spalte); None bei zu wenigen Ankern."""
+    anchors = sorted({f"{a}@{_column(r)}" for r in regions if (a := anchor_label(r.label))})
+    if len(anchors) < TEMPLATE_MIN_ANCHORS:
+        return None
+    return hashlib.blake2b("\n".join(anchors).encode("utf-8"), digest_size=8).hexdigest()
+
+
+def locate(regions, field, value, normalize):
+    """
+    Wo steht value auf der Seite? → Position {"label": …} oder {"box": [x0, y0], "prefix": …},
+    {"missing": True} für value=None (Feld nicht gefunden).
+    Nur eindeutige Fälle: der ganze Regionswert ergibt value, ohne Label darf ein fester
+    Text ohne Ziffern davor stehen. None, wenn nichts passt.
+    """
+    if value is None:
+        return {"missing": True}
+    seen = set()
+    for r in regions:
+        a = anchor_label(r.label)
+        if not a or a in seen:
+            continue  # read_location liest das erste Vorkommen eines Ankers
+        seen.add(a)
+        if normalize(field, r.value) == value:
+            return {"label": a}
+    for r in regions:
+        if r.label:
+            continue
+        prefix = r.value[:len(r.value) - len(value)] if r.value.endswith(value) else None
+        if prefix is None or any(c.isdigit() for c in prefix):
+            continue
+        if normalize(field, r.value[len(prefix):]) == value:
+            return {"box": [round(r.bbox[0], 1), round(r.bbox[1], 1)], "prefix": prefix}
+    return None
+
+
+def same_location(a, b):
+    """Gleiche Position? Labels exakt, Positionen im Raster von TEMPLATE_GRID."""
+    if "box" not in a or "box" not in b:
+        return a.get("label") == b.get("label") and a.get("missing") == b.get("missing")
+    return a["prefix"] == b["prefix"] and all(abs(p - q) <= TEMPLATE_GRID for p, q in zip(a["box"], b["box"]))
+
+
+def read_location(regions, loc):
+    """Position einer Vorlage → Rohwert aus den Regionen der Seite (None, wenn nicht vorhanden)."""
+    if "label" in loc:
+        for r in regions:
+            if anchor_label(r.label) == loc["label"]:
+                return r.value.strip() or None
+        return None
+    x, y = loc["box"]
+    for r in regions:
+        if r.label or abs(r.bbox[0] - x) > TEMPLATE_GRID or abs(r.bbox[1] - y) > TEMPLATE_GRID:
+            continue
+        if r.value.startswith(loc["prefix"]):
+            return r.value[len(loc["prefix"]):].strip() or None
+    return None
+
+
+class TemplateRegistry:
+    """
+    Vorlagen je Fingerabdruck und Modellversion:
+    {"fp@modell": {"fields": {Feld: {Position…, "n": Bestätigungen}}, "docs": n, "seen": [Hash…]}}.
+    Thread-sicher. Geschrieben wird gesammelt (höchstens alle save_interval Sekunden, flush(),
+    beim Prozessende) und atomar; dabei wird der Dateistand anderer Prozesse übernommen (_merge).
+    """
+
+    def __init__(self, path=TEMPLATE_PATH, confirmations=TEMPLATE_CONFIRMATIONS, save_interval=TEMPLATE_SAVE_INTERVAL):
+        self.path = Path(path)
+        self.confirmations = confirmations
+        self.save_interval = save_interval
+        self._lock = threading.Lock()
+        self.templates = self._load()
+        self._dirty = False
+        self._saved_at = time.monotonic()
+        atexit.register(self.flush)
+
+    def _load(self):
+        if not self.path.exists():
+            return {}
+        with open(self.path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def match(self, regions, fields, model="none"):
+        """
+        → (Vorlagen-Schlüssel, {Feld: Rohwert bzw. None für fehlend}) für alle bestätigten Felder
+        der Auswahl. Schlüssel None, wenn die Seite zu wenige Anker hat.
+        """
+        fp = fingerprint(regions)
+        key = f"{fp}@{model}" if fp else None
+        with self._lock:
+            tpl = self.templates.get(key) if key else None
+            locs = dict(tpl["fields"]) if tpl else {}
+        values = {}
+        for field in fields:
+            loc = locs.get(field)
+            if not loc or loc["n"] < self.confirmations:
+                continue
+            if loc.get("missing"):
+                values[field] = None
+            else:
+                raw = read_location(regions, loc)
+                if raw:
+                    values[field] = raw
+        return key, values
+
+    def learn(self, key, regions, record, normalize, doc_id):
+        """
+        Werte aus NER/Regex (None = nicht gefunden) einer Vorlage zuordnen. Gleiche Position wie bisher →
+        eine Bestätigung mehr, abweichende Position ersetzt die alte. Ein bereits gesehenes Dokument
+        (doc_id, z. B. SHA-256) zählt nicht erneut. → Anzahl gelernter Felder.
+        """
+        if not key:
+            return 0
+        learned = {f: loc for f, v in record.items() if (loc := locate(regions, f, v, normalize))}
+        if not learned:
+            return 0
+        doc_id = doc_id[:16]
+        with self._lock:
+            tpl = self.templates.setdefault(key, {"fields": {}, "docs": 0, "seen": []})
+            if doc_id in tpl["seen"]:
+                return 0
+            tpl["seen"] = (tpl["seen"] + [doc_id])[-TEMPLATE_SEEN:]
+            tpl["docs"] += 1
+            for field, loc in learned.items():
+                old = tpl["fields"].get(field)
+                same = old is not None and same_location(old, loc)
+                tpl["fields"][field] = {**loc, "n": old["n"] + 1 if same else 1}
+            self._dirty = True
+            if time.monotonic() - self._saved_at >= self.save_interval:
+                self._save()
+        return len(learned)
+
+    def flush(self):
+        """Gesammelte Änderungen jetzt schreiben (z. B. am Ende eines Batch-Pakets)."""
+        with self._lock:
+            if self._dirty:
+                self._save()
+
+    def _merge(self, disk):
+        """
+        Dateistand anderer Prozesse (Batch-, Dienst-Worker) übernehmen: je Feld bei gleicher
+        Position die höhere Bestätigungszahl, bei abweichender die besser bestätigte Position.
+        """
+        for key, theirs in disk.items():
+            mine = self.templates.setdefault(key, theirs)
+            if mine is theirs:
+                continue
+            for field, loc in theirs["fields"].items():
+                own = mine["fields"].get(field)
+                if own is not None and same_location(own, loc):
+                    own["n"] = max(own["n"], loc["n"])
+                elif own is None or loc["n"] > own["n"]:
+                    mine["fields"][field] = loc
+            mine["docs"] = max(mine["docs"], theirs["docs"])
+            mine["seen"] = (theirs["seen"] + [d for d in mine["seen"] if d not in theirs["seen"]])[-TEMPLATE_SEEN:]
+
+    def _save(self):
+        self._merge(self._load())
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.templates, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, self.path)
+        self._dirty = False
+        self._saved_at = time.monotonic()
+
+
+def enable_templates(enabled=True):
+    global TEMPLATES
+    TEMPLATES = enabled
+
+
+def default_registry():
+    """TemplateRegistry unter TEMPLATE_PATH, wenn TEMPLATES=1 gesetzt ist, sonst None."""
+    return TemplateRegistry() if TEMPLATES else None
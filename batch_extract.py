@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""
+batch_extract.py – Feldextraktion für ganze PDF-Ordner ohne Streamlit
+
+Beispiele:
+    python batch_extract.py Rechnungen --out data/exports/rechnungen.jsonl
+    python batch_extract.py "Rechnungen/**/*.pdf" --out ergebnisse.csv --fields Rechnungsnummer,Datum,IBAN
+    python batch_extract.py archiv/ --out archiv.xlsx --workers 16
+    python batch_extract.py Rechnungen/langsam.pdf --out /tmp/x.jsonl --no-resume --profile langsam.prof
+
+Text/OCR, NER und Regex-Fallback laufen in einem Prozess-Pool (ein Modell pro Prozess).
+Ergebnisse werden sofort geschrieben; ein erneuter Aufruf überspringt bereits
+verarbeitete Dateien (--no-resume schaltet das ab).
+"""
+
+import argparse
+import glob
+import os
+import sys
+import time
+from multiprocessing import Pool
+
+from app.utils.extractor import InvoiceExtractor, DEFAULT_FIELDS
+from app.utils.patterns import FIELD_PATTERNS
+from app.utils.sinks import open_sink, KEY_COLUMN, ERROR_COLUMN
+from app.utils.metrics import METRICS, profile
+from app.utils.ocr_reader import enable_ocr_cache
+from app.utils.templates import enable_templates
+
+# ---------------------- Worker ----------------------
+_extractor = None
+
+def _init_worker(fields, ocr_cache=False, templates=False):
+    """Einmal pro Prozess: Modell laden und vorwärmen."""
+    global _extractor
+    if ocr_cache:
+        enable_ocr_cache()
+    if templates:
+        enable_templates()
+    _extractor = InvoiceExtractor(fields=fields, n_process=1).warmup()
+
+def _process_chunk(paths):
+    """Ein Paket Dateien → [(Pfad, Datensatz)]; NER läuft gebündelt über nlp.pipe."""
+    results = []
+    try:
+        for path, record in zip(paths, _extractor.extract_many(paths)):
+            results.append((path, record))
+    except Exception:
+        # Ein kaputtes PDF soll nicht das ganze Paket kosten → ab dort einzeln weiter;
+        # bereits fertige Dateien laufen nicht doppelt (Cache, Vorlagen-Lernen)
+        for path in paths[len(results):]:
+            try:
+                results.append((path, _extractor.extract(path)))
+            except Exception as e:
+                results.append((path, {ERROR_COLUMN: f"{type(e).__name__}: {e}"}))
+    # Pool-Worker enden ohne atexit → Gelerntes je Paket schreiben
+    if _extractor.templates is not None:
+        _extractor.templates.flush()
+    return results
+
+# ---------------------- Eingabe ----------------------
+def collect_pdfs(sources):
+    """Ordner (rekursiv) oder Glob-Muster → sortierte, eindeutige PDF-Pfade."""
+    paths = []
+    for src in sources:
+        if os.path.isdir(src):
+            paths.extend(glob.glob(os.path.join(src, "**", "*.pdf"), recursive=True))
+            paths.extend(glob.glob(os.path.join(src, "**", "*.PDF"), recursive=True))
+        else:
+            paths.extend(glob.glob(src, recursive=True))
+    return sorted(set(p for p in paths if p.lower().endswith(".pdf")))
+
+def chunked(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+# ---------------------- Main ----------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rechnungsfelder aus vielen PDFs extrahieren")
+    parser.add_argument("src", nargs="+", help="Ordner oder Glob-Muster (z. B. 'Rechnungen/**/*.pdf')")
+    parser.add_argument("--out", required=True, help="Ausgabedatei (.jsonl, .csv, .xlsx oder .parquet)")
+    parser.add_argument("--format", choices=["jsonl", "csv", "xlsx", "parquet"], help="Format statt Dateiendung")
+    parser.add_argument("--fields", default=",".join(DEFAULT_FIELDS),
+                        help="Kommagetrennte Feldliste oder 'all'")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Anzahl Prozesse")
+    parser.add_argument("--chunk", type=int, default=8, help="Dateien pro Paket (NER-Batch je Prozess)")
+    parser.add_argument("--no-resume", action="store_true", help="Bereits verarbeitete Dateien nicht überspringen")
+    parser.add_argument("--ocr-cache", action="store_true",
+                        help="OCR-Text je Seite auf der Platte cachen (wiederkehrende Seiten kosten nur einen Hash)")
+    parser.add_argument("--templates", action="store_true",
+                        help="Lieferanten-Vorlagen lernen und bekannte Layouts ohne NER auslesen")
+    parser.add_argument("--profile", metavar="DATEI",
+                        help="Im Hauptprozess ohne Pool laufen und profilieren (.prof/.html/.txt)")
+    parser.add_argument("--profiler", choices=["cprofile", "pyinstrument"], help="Profiler für --profile")
+    args = parser.parse_args(argv)
+
+    fields = list(FIELD_PATTERNS) if args.fields == "all" else [f.strip() for f in args.fields.split(",") if f.strip()]
+    columns = [KEY_COLUMN, *fields, ERROR_COLUMN]
+
+    pdfs = collect_pdfs(args.src)
+    if not pdfs:
+        sys.exit(f"Keine PDFs gefunden: {' '.join(args.src)}")
+
+    try:
+        sink = open_sink(args.out, columns, args.format)
+    except ValueError as e:
+        sys.exit(f"❌ {e}")
+    pool = None
+    try:
+        if not args.no_resume:
+            done = sink.done_keys()
+            skipped = len(pdfs)
+            pdfs = [p for p in pdfs if p not in done]
+            skipped -= len(pdfs)
+            if skipped:
+                print(f"Überspringe {skipped} bereits verarbeitete Datei(en).")
+        print(f"Verarbeite {len(pdfs)} PDF(s) mit {args.workers} Prozess(en) → {args.out}")
+
+        t0 = time.perf_counter()
+        n = errors = 0
+        if args.profile:
+            # Modell vorab laden, damit das Profil nur die eigentliche Extraktion zeigt
+            _init_worker(fields, args.ocr_cache, args.templates)
+            with profile(args.profile, args.profiler):
+                results = _process_chunk(pdfs)
+            chunks = [results]
+        else:
+            pool = Pool(args.workers, initializer=_init_worker, initargs=(fields, args.ocr_cache, args.templates))
+            chunks = pool.imap_unordered(_process_chunk, chunked(pdfs, args.chunk))
+        for results in chunks:
+            for path, record in results:
+                sink.write({KEY_COLUMN: path, **record})
+                n += 1
+                errors += ERROR_COLUMN in record
+            print(f"  {n}/{len(pdfs)} fertig", end="\r", flush=True)
+    finally:
+        if pool is not None:
+            pool.terminate()
+        sink.close()
+
+    dt = time.perf_counter() - t0
+    print(f"\n✅ {n} Datei(en) in {dt:.1f} s ({n / max(dt, 1e-9):.1f} Dok/s), Fehler: {errors}")
+    if args.profile:
+        print(f"Profil gespeichert: {args.profile}\n")
+        print(METRICS.render())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+"""
+pipeline.py – End-to-End-Benchmark der Extraktions-Pipeline über den Rechnungen/-Korpus
+
+Jedes Dokument läuft durch InvoiceExtractor.extract() – also genau die Pipeline der App inkl.
+Frühabbruch, Stufenplan und Layout-Modus. Die Zeiten je Stufe (template, text, ocr, regex, ner, …)
+stammen aus den stage()-Histogrammen in utils.metrics (pdf_transfer_stage_seconds), die nach
+jedem Dokument abgeholt werden. Berichtet werden Dok/s, p50/p95-Latenz, Peak-Speicher und
+Trefferquote je Feld. Das Ergebnis kann als JSON gespeichert und mit einem früheren Lauf
+(z. B. vom letzten Commit) verglichen werden.
+
+Aufruf (aus dem Projekt-Root):
+    python benchmarks/pipeline.py
+    python benchmarks/pipeline.py --scale 10 --out bench.json
+    python benchmarks/pipeline.py --long 20 --compare bench.json
+"""
+
+import argparse
+import datetime
+import glob
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+try:
+    import resource  # nur POSIX
+except ImportError:
+    resource = None
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import app.utils.extractor as extractor_module
+from app.utils.pdf_reader import open_fitz, TEXT_BACKEND
+from app.utils.metrics import METRICS, STAGE_METRIC
+from app.utils.extractor import InvoiceExtractor, DEFAULT_FIELDS, NOT_FOUND, NOT_DEFINED
+
+# Berichtsreihenfolge; weitere Stufen aus den Metriken werden hinten angehängt.
+# ocr_raster/ocr_tesseract sind Teil von ocr (Tesseract summiert über die OCR-Threads).
+STAGES = ["template", "text", "ocr", "ocr_raster", "ocr_tesseract", "regex", "ner", "persons"]
+DEFAULT_SOURCES = [os.path.join(ROOT, "Rechnungen"), os.path.join(ROOT, "Rechnungen", "15bessereRechnungen")]
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = (len(values) - 1) * p / 100
+    lo, hi = int(k), min(int(k) + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def load_corpus(sources, scale, long_pages):
+    """PDF-Bytes laden; scale wiederholt den Korpus, long_pages baut lange Dokumente aus Seitenkopien."""
+    paths = []
+    for src in sources:
+        paths.extend(sorted(glob.glob(os.path.join(src, "*.pdf"))))
+    corpus = [(os.path.relpath(p, ROOT), open(p, "rb").read()) for p in paths]
+    if long_pages > 1:
+        corpus = [(name, _repeat_pages(data, long_pages)) for name, data in corpus]
+    return [(f"{name}#{i}" if scale > 1 else name, data) for i in range(scale) for name, data in corpus]
+
+
+def _repeat_pages(pdf_bytes, times):
+    src = open_fitz(pdf_bytes)
+    out = open_fitz(pdf_bytes)
+    for _ in range(times - 1):
+        out.insert_pdf(src)
+    return out.tobytes()
+
+
+def stage_ms(snap):
+    """METRICS.drain()-Schnappschuss → {Stufe: ms} aus den stage()-Histogrammen."""
+    ms = {}
+    for (name, labels), h in snap["histograms"].items():
+        if name == STAGE_METRIC:
+            s = dict(labels)["stage"]
+            ms[s] = ms.get(s, 0.0) + h[-2] * 1000
+    return ms
+
+
+def run_document(extractor, pdf_bytes, fields):
+    """Eine Datei durch extractor.extract(); → (Gesamtzeit in ms, Zeiten in ms je Stufe, Datensatz)."""
+    METRICS.drain()  # Werte vorheriger Dokumente verwerfen
+    t0 = time.perf_counter()
+    record = extractor.extract(pdf_bytes, fields)
+    total = (time.perf_counter() - t0) * 1000
+    return total, stage_ms(METRICS.drain()), record
+
+
+def summarize(docs, wall, fields):
+    totals = [d["total_ms"] for d in docs]
+    names = STAGES + sorted({s for d in docs for s in d["ms"]} - set(STAGES))
+    stages = {}
+    for s in names:
+        vals = [d["ms"].get(s, 0.0) for d in docs]
+        if not any(vals):
+            continue
+        stages[s] = {"mean_ms": round(statistics.fmean(vals), 3), "p50_ms": round(percentile(vals, 50), 3),
+                     "p95_ms": round(percentile(vals, 95), 3), "total_ms": round(sum(vals), 1)}
+    found = {f: round(sum(d["record"].get(f) not in (None, NOT_FOUND, NOT_DEFINED) for d in docs) / len(docs), 3)
+             for f in fields}
+    return {
+        "docs": len(docs),
+        "wall_s": round(wall, 3),
+        "docs_per_s": round(len(docs) / wall, 2) if wall else 0.0,
+        "p50_ms": round(percentile(totals, 50), 2),
+        "p95_ms": round(percentile(totals, 95), 2),
+        "stages": stages,
+        "found_rate": found,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except Exception:
+        return None
+
+
+def print_report(summary, peak):
+    print(f"\n{summary['docs']} Dokumente in {summary['wall_s']:.2f} s → {summary['docs_per_s']:.1f} Dok/s"
+          f" | p50 {summary['p50_ms']:.1f} ms | p95 {summary['p95_ms']:.1f} ms")
+    py = f"{peak['tracemalloc_mb']:.1f} MB" if peak["tracemalloc_mb"] is not None else "– (--trace-memory)"
+    print(f"Peak-Speicher: RSS {peak['max_rss_mb'] or 0:.1f} MB, Python {py}\n")
+    print(f"{'Stufe':<14} {'Mittel':>10} {'p50':>10} {'p95':>10} {'Summe':>11}")
+    for s, v in summary["stages"].items():
+        print(f"{s:<14} {v['mean_ms']:>8.2f}ms {v['p50_ms']:>8.2f}ms {v['p95_ms']:>8.2f}ms {v['total_ms']:>9.1f}ms")
+    print("\nTrefferquote: " + ", ".join(f"{f} {r:.0%}" for f, r in summary["found_rate"].items()))
+
+
+def print_compare(summary, baseline_path):
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        base = json.load(f)
+    b = base["summary"]
+    print(f"\nVergleich mit {baseline_path} (Commit {base['meta'].get('commit')}):")
+
+    def delta(new, old):
+        return f"{new:.2f} vs {old:.2f} ({(new - old) / old * 100:+.1f} %)" if old else f"{new:.2f} vs {old:.2f}"
+
+    print(f"  Dok/s     {delta(summary['docs_per_s'], b['docs_per_s'])}")
+    print(f"  p50 ms    {delta(summary['p50_ms'], b['p50_ms'])}")
+    print(f"  p95 ms    {delta(summary['p95_ms'], b['p95_ms'])}")
+    for s, v in summary["stages"].items():
+        if s in b["stages"]:
+            print(f"  {s:<13} {delta(v['mean_ms'], b['stages'][s]['mean_ms'])}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark der Extraktions-Pipeline")
+    parser.add_argument("--src", nargs="+", default=DEFAULT_SOURCES, help="Ordner mit PDFs")
+    parser.add_argument("--fields", default=",".join(DEFAULT_FIELDS), help="Kommagetrennte Feldliste")
+    parser.add_argument("--scale", type=int, default=1, help="Korpus n-fach wiederholen")
+    parser.add_argument("--long", type=int, default=1, help="Jedes PDF auf n-fache Seitenzahl verlängern")
+    parser.add_argument("--force-ocr", action="store_true",
+                        help="Jede Seite gilt als Bildseite und geht zusätzlich durch die OCR")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="Python-Peak per tracemalloc messen (verlangsamt die Zeiten merklich)")
+    parser.add_argument("--out", help="Ergebnis als JSON speichern")
+    parser.add_argument("--compare", help="Früheres JSON-Ergebnis zum Vergleich")
+    args = parser.parse_args(argv)
+
+    fields = [f.strip() for f in args.fields.split(",") if f.strip()]
+    if args.force_ocr:
+        extractor_module.MIN_PAGE_CHARS = sys.maxsize
+    corpus = load_corpus(args.src, args.scale, args.long)
+    if not corpus:
+        sys.exit(f"Keine PDFs gefunden in {args.src}")
+
+    t0 = time.perf_counter()
+    extractor = InvoiceExtractor(fields=fields).warmup()
+    load_s = time.perf_counter() - t0
+    print(f"Modell geladen in {load_s:.2f} s, {len(corpus)} Dokument(e), Backend {TEXT_BACKEND}")
+
+    if args.trace_memory:
+        tracemalloc.start()
+    docs = []
+    t0 = time.perf_counter()
+    for name, data in corpus:
+        total, ms, record = run_document(extractor, data, fields)
+        docs.append({"file": name, "total_ms": round(total, 3), "ms": {k: round(v, 3) for k, v in ms.items()},
+                     "record": record})
+    wall = time.perf_counter() - t0
+    peak_py = None
+    if args.trace_memory:
+        _, peak_py = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    max_rss = None
+    if resource is not None:
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        max_rss = rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+    peak = {"tracemalloc_mb": round(peak_py / (1024 * 1024), 2) if peak_py else None,
+            "max_rss_mb": round(max_rss, 1) if max_rss else None}
+
+    summary = summarize(docs, wall, fields)
+    print_report(summary, peak)
+
+    result = {
+        "meta": {"commit": git_commit(), "date": datetime.datetime.now().isoformat(timespec="seconds"),
+                 "python": platform.python_version(), "platform": platform.platform(),
+                 "text_backend": TEXT_BACKEND, "layout": extractor.layout,
+                 "templates": extractor.templates is not None, "model_version": extractor.model_version,
+                 "model_load_s": round(load_s, 3), "args": vars(args)},
+        "summary": summary,
+        "peak_memory": peak,
+        "docs": docs,
+    }
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"\nErgebnis gespeichert: {args.out}")
+    if args.compare:
+        print_compare(summary, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""
+text_backends.py – Vergleich der Text-Backends (PyMuPDF vs. pdfplumber) auf dem Rechnungen/-Korpus
+Misst Laufzeit und Textlänge und vergleicht die Regex-Treffer (FIELD_PATTERNS) jedes Backends
+mit pdfplumber; abweichende Werte werden je Datei und Feld ausgegeben.
+
+Aufruf (aus dem Projekt-Root):
+    python benchmarks/text_backends.py
+    python benchmarks/text_backends.py --src Rechnungen --repeat 5
+"""
+
+import argparse
+import glob
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from app.utils.pdf_reader import BACKENDS, extract_text_from_pdf
+from app.utils.patterns import FIELD_MATCHER, FIELD_PATTERNS
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--src", default=os.path.join(ROOT, "Rechnungen"), help="Ordner mit PDFs (rekursiv)")
+parser.add_argument("--repeat", type=int, default=3, help="Wiederholungen pro Datei (Median zählt)")
+args = parser.parse_args()
+
+pdfs = sorted(glob.glob(os.path.join(args.src, "**", "*.pdf"), recursive=True))
+if not pdfs:
+    sys.exit(f"Keine PDFs gefunden in {args.src}")
+print(f"{len(pdfs)} PDFs aus {args.src}, {args.repeat} Wiederholungen\n")
+
+results, hits = {}, {}
+for backend in BACKENDS:
+    per_file = []
+    chars = 0
+    hits[backend] = []
+    for path in pdfs:
+        runs = []
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            text = extract_text_from_pdf(path, backend=backend)
+            runs.append((time.perf_counter() - t0) * 1000)
+        per_file.append(statistics.median(runs))
+        chars += len(text)
+        hits[backend].append(FIELD_MATCHER.find_all(text, list(FIELD_PATTERNS)))
+    results[backend] = per_file
+    print(f"{backend:<11} | Median {statistics.median(per_file):8.2f} ms/PDF"
+          f" | Max {max(per_file):8.2f} ms | Summe {sum(per_file):9.1f} ms | Zeichen {chars}")
+
+if "fitz" in results and "pdfplumber" in results:
+    speedup = sum(results["pdfplumber"]) / max(sum(results["fitz"]), 1e-9)
+    print(f"\nfitz ist {speedup:.1f}x schneller als pdfplumber")
+
+# Regex-Treffer gegen pdfplumber (Referenz)
+reference = hits.get("pdfplumber")
+for backend in BACKENDS:
+    if reference is None or backend == "pdfplumber":
+        continue
+    same = total = 0
+    for path, ref, got in zip(pdfs, reference, hits[backend]):
+        for field in sorted(set(ref) | set(got)):
+            total += 1
+            if ref.get(field) == got.get(field):
+                same += 1
+            else:
+                print(f"  {os.path.relpath(path, args.src)} | {field}: pdfplumber {ref.get(field)!r} vs {backend} {got.get(field)!r}")
+    print(f"Regex-Treffer {backend} vs pdfplumber: {sum(map(len, hits[backend]))} vs {sum(map(len, reference))},"
+          f" {same}/{total} Felder mit gleichem Wert")
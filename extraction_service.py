@@ -0,0 +1,314 @@
+# -*- coding: utf-8 -*-
+"""
+extraction_service.py – lokaler HTTP-Dienst für die Rechnungsextraktion (asyncio, nur Standardbibliothek)
+
+Start:
+    python extraction_service.py --port 8765 --workers 8
+
+API (JSON):
+    POST /jobs?fields=Rechnungsnummer,Datum   Body = PDF-Bytes  → 202 {"job_id", "status"}
+    GET  /jobs/<id>                           → {"status": queued|running|done|error, "result"|"error"}
+    GET  /jobs/<id>?wait=30                   → wartet bis zu 30 s auf das Ergebnis (Long-Poll)
+    POST /extract?fields=...                  Body = PDF-Bytes  → Ergebnis direkt (submit + wait)
+    GET  /health                              → Status, Queue-Länge, Worker, Jobs, Pool-Neustarts
+    GET  /metrics                             → Prometheus-Textformat (Zeiten je Stufe, Zähler)
+
+Jobs landen in einer begrenzten Queue; ist sie voll, antwortet der Dienst mit 503 und
+Retry-After (Backpressure). Dahinter arbeitet ein Prozess-Pool mit einem geladenen
+spaCy-Modell pro Prozess, der Durchsatz skaliert also mit den Kernen. Stirbt ein Worker
+(z. B. Speicher bei großen Scans), wird der Pool neu gestartet; /health meldet das.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from urllib.parse import urlsplit, parse_qs
+
+from app.utils.extractor import InvoiceExtractor, DEFAULT_FIELDS
+from app.utils.metrics import METRICS
+from app.utils.ocr_reader import enable_ocr_cache
+from app.utils.templates import enable_templates
+
+JOB_TTL = 15 * 60          # fertige Jobs so lange abrufbar (Sekunden)
+MAX_WAIT = 60              # Obergrenze für ?wait=
+DEGRADED_FOR = 5 * 60      # so lange nach einem Pool-Neustart meldet /health "degraded" (Sekunden)
+STATUS_TEXT = {200: "OK", 202: "Accepted", 400: "Bad Request", 404: "Not Found",
+               405: "Method Not Allowed", 413: "Payload Too Large", 500: "Internal Server Error",
+               503: "Service Unavailable"}
+
+# ---------------------- Worker-Prozesse ----------------------
+_extractor = None
+
+def _init_worker(ocr_cache=False, templates=False):
+    """Einmal pro Prozess: Modell laden und vorwärmen."""
+    global _extractor
+    if ocr_cache:
+        enable_ocr_cache()
+    if templates:
+        enable_templates()
+    _extractor = InvoiceExtractor(n_process=1).warmup()
+
+def _extract_job(pdf_bytes, fields):
+    """→ (Datensatz, Metriken des Jobs); der Hauptprozess führt die Metriken zusammen."""
+    try:
+        return _extractor.extract(pdf_bytes, fields), METRICS.drain()
+    except Exception:
+        METRICS.drain()
+        raise
+
+def _ping():
+    return os.getpid()
+
+# ---------------------- Jobs & Queue ----------------------
+class Job:
+    def __init__(self, pdf_bytes, fields):
+        self.id = uuid.uuid4().hex
+        self.pdf_bytes = pdf_bytes
+        self.fields = fields
+        self.status = "queued"
+        self.result = None
+        self.error = None
+        self.finished_at = None
+        self.done = asyncio.Event()
+
+    def as_dict(self):
+        d = {"job_id": self.id, "status": self.status}
+        if self.status == "done":
+            d["result"] = self.result
+        elif self.status == "error":
+            d["error"] = self.error
+        return d
+
+
+class ExtractionService:
+    def __init__(self, workers, queue_size, max_bytes, ocr_cache=False, templates=False):
+        self.workers = workers
+        self.max_bytes = max_bytes
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.jobs = {}
+        self._initargs = (ocr_cache, templates)
+        self.pool = self._new_pool()
+        self.pool_restarts = 0
+        self.pool_error = None      # letzter Absturz: (Zeitpunkt monotonic, Meldung)
+
+    def _new_pool(self):
+        # "spawn" statt fork: Worker erben sonst offene Client-Sockets und Verbindungen schließen nicht
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker, initargs=self._initargs,
+                                   mp_context=multiprocessing.get_context("spawn"))
+
+    def _restart_pool(self, broken, error):
+        """
+        Nach einem Worker-Absturz ist der ganze ProcessPoolExecutor unbrauchbar → neu anlegen.
+        Mehrere Consumer sehen denselben Absturz; neu gestartet wird nur einmal pro Pool.
+        Die neuen Prozesse laden das Modell beim ersten Job.
+        """
+        if broken is not self.pool:
+            return
+        logging.getLogger("pdf_transfer.service").error("Worker-Pool abgestürzt, starte neu: %s", error)
+        broken.shutdown(wait=False, cancel_futures=True)
+        self.pool = self._new_pool()
+        self.pool_restarts += 1
+        self.pool_error = (time.monotonic(), error)
+        METRICS.inc("pdf_transfer_pool_restarts_total")
+
+    async def start_workers(self):
+        """Alle Prozesse vorab starten, damit das Modell vor der ersten Anfrage geladen ist."""
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(self.pool, _ping) for _ in range(self.workers)))
+
+    def submit(self, pdf_bytes, fields):
+        """Job einreihen; None, wenn die Queue voll ist (→ 503)."""
+        job = Job(pdf_bytes, fields)
+        try:
+            self.queue.put_nowait(job)
+        except asyncio.QueueFull:
+            return None
+        self.jobs[job.id] = job
+        return job
+
+    async def consume(self):
+        """Ein Consumer pro Worker-Prozess: so sind nie mehr Jobs in Arbeit als Prozesse."""
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self.queue.get()
+            job.status = "running"
+            t0 = time.perf_counter()
+            pool = self.pool
+            try:
+                job.result, snap = await loop.run_in_executor(pool, _extract_job, job.pdf_bytes, job.fields)
+                METRICS.merge(snap)
+                job.status = "done"
+            except BrokenProcessPool as e:
+                job.error = f"Worker-Prozess abgebrochen (z. B. Speicher): {e}"
+                job.status = "error"
+                self._restart_pool(pool, job.error)
+            except Exception as e:
+                job.error = f"{type(e).__name__}: {e}"
+                job.status = "error"
+            finally:
+                METRICS.inc("pdf_transfer_jobs_total", status=job.status)
+                METRICS.observe("pdf_transfer_job_seconds", time.perf_counter() - t0)
+                job.pdf_bytes = None
+                job.finished_at = time.monotonic()
+                job.done.set()
+                self.queue.task_done()
+
+    async def expire(self):
+        """Fertige Jobs nach JOB_TTL vergessen, damit der Speicher nicht wächst."""
+        while True:
+            await asyncio.sleep(60)
+            now = time.monotonic()
+            for job_id in [j.id for j in self.jobs.values() if j.finished_at and now - j.finished_at > JOB_TTL]:
+                del self.jobs[job_id]
+
+    async def wait(self, job, timeout):
+        try:
+            await asyncio.wait_for(job.done.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return job
+
+    # ---------------------- HTTP ----------------------
+    async def handle(self, reader, writer):
+        try:
+            status, body, headers = await self._dispatch(reader)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+            return
+        except Exception as e:
+            status, body, headers = 500, {"error": f"{type(e).__name__}: {e}"}, {}
+        if isinstance(body, str):
+            payload, content_type = body.encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8"
+        else:
+            payload, content_type = json.dumps(body, ensure_ascii=False).encode("utf-8"), "application/json; charset=utf-8"
+        head = [f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}",
+                f"Content-Type: {content_type}",
+                f"Content-Length: {len(payload)}",
+                "Connection: close"]
+        head += [f"{k}: {v}" for k, v in headers.items()]
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + payload)
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def _dispatch(self, reader):
+        request_line = (await reader.readline()).decode("latin-1").strip()
+        if not request_line:
+            raise ConnectionError("leere Anfrage")
+        try:
+            method, target, _ = request_line.split(" ", 2)
+        except ValueError:
+            return 400, {"error": "Ungültige Anfragezeile"}, {}
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode("latin-1").strip()
+            if not line:
+                break
+            k, _, v = line.partition(":")
+            headers[k.strip().lower()] = v.strip()
+
+        try:
+            url = urlsplit(target)
+        except ValueError:
+            return 400, {"error": "Ungültige URL"}, {}
+        query = parse_qs(url.query)
+        parts = [p for p in url.path.split("/") if p]
+
+        if parts == ["health"] and method == "GET":
+            health = {"status": "ok", "queue": self.queue.qsize(), "queue_max": self.queue.maxsize,
+                      "workers": self.workers, "jobs": len(self.jobs), "pool_restarts": self.pool_restarts}
+            if self.pool_error:
+                at, error = self.pool_error
+                ago = time.monotonic() - at
+                health.update(last_pool_error=error, last_pool_error_s_ago=round(ago))
+                if ago < DEGRADED_FOR:
+                    health["status"] = "degraded"
+            return 200, health, {}
+
+        if parts == ["metrics"] and method == "GET":
+            METRICS.set("pdf_transfer_queue_depth", self.queue.qsize())
+            METRICS.set("pdf_transfer_jobs_tracked", len(self.jobs))
+            return 200, METRICS.render(), {}
+
+        if parts in (["jobs"], ["extract"]):
+            if method != "POST":
+                return 405, {"error": "POST erwartet"}, {}
+            try:
+                length = int(headers.get("content-length", "0"))
+            except ValueError:
+                return 400, {"error": "Content-Length ist keine Zahl"}, {}
+            if length <= 0:
+                return 400, {"error": "PDF als Request-Body senden (Content-Length fehlt)"}, {}
+            if length > self.max_bytes:
+                return 413, {"error": f"Datei größer als {self.max_bytes // (1024 * 1024)} MB"}, {}
+            pdf_bytes = await reader.readexactly(length)
+            fields = query.get("fields", [",".join(DEFAULT_FIELDS)])[0].split(",")
+            job = self.submit(pdf_bytes, [f.strip() for f in fields if f.strip()])
+            if job is None:
+                return 503, {"error": "Queue voll, später erneut versuchen"}, {"Retry-After": "2"}
+            if parts == ["extract"]:
+                await job.done.wait()
+                return 200, job.as_dict(), {}
+            return 202, job.as_dict(), {"Location": f"/jobs/{job.id}"}
+
+        if len(parts) == 2 and parts[0] == "jobs" and method == "GET":
+            job = self.jobs.get(parts[1])
+            if job is None:
+                return 404, {"error": "Job unbekannt oder abgelaufen"}, {}
+            try:
+                wait = min(float(query.get("wait", ["0"])[0]), MAX_WAIT)
+            except ValueError:
+                return 400, {"error": "wait muss eine Zahl (Sekunden) sein"}, {}
+            if wait > 0:
+                await self.wait(job, wait)
+            return 200, job.as_dict(), {}
+
+        return 404, {"error": "Unbekannter Pfad"}, {}
+
+
+async def serve(host, port, workers, queue_size, max_bytes, ocr_cache=False, templates=False):
+    service = ExtractionService(workers, queue_size, max_bytes, ocr_cache, templates)
+    print(f"Starte {workers} Worker-Prozess(e) und lade das Modell …")
+    await service.start_workers()
+    tasks = [asyncio.create_task(service.consume()) for _ in range(workers)]
+    tasks.append(asyncio.create_task(service.expire()))
+    server = await asyncio.start_server(service.handle, host, port)
+    print(f"Extraktionsdienst läuft auf http://{host}:{port} ({workers} Worker, Queue {queue_size})")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        for t in tasks:
+            t.cancel()
+        service.pool.shutdown(cancel_futures=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="HTTP-Dienst für die Rechnungsextraktion")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Prozesse (je ein Modell)")
+    parser.add_argument("--queue", type=int, default=64, help="Max. wartende Jobs, danach 503")
+    parser.add_argument("--max-mb", type=int, default=5, help="Max. PDF-Größe in MB")
+    parser.add_argument("--ocr-cache", action="store_true", help="OCR-Text je Seite auf der Platte cachen")
+    parser.add_argument("--templates", action="store_true",
+                        help="Lieferanten-Vorlagen lernen und bekannte Layouts ohne NER auslesen")
+    parser.add_argument("--log-level", default="WARNING", help="z. B. DEBUG für eine JSON-Zeile pro Stufe")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s %(name)s %(message)s")
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers, args.queue, args.max_mb * 1024 * 1024,
+                          args.ocr_cache, args.templates))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
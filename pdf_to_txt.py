@@ -1,6 +1,6 @@
 import os
-from app.utils.pdf_reader import extract_text_from_pdf
-from app.utils.ocr_reader import ocr_from_pdf
+from app.utils.extractor import read_pdf_text
+from app.utils.pdf_reader import EXPORT_MAX_PAGES
 
 # Pfad zum PDF-Ordner
 pdf_dir = r"C:\Leben\PDF_Transfer\Rechnungen\15bessereRechnungen"
@@ -14,13 +14,9 @@ for filename in os.listdir(pdf_dir):
         pdf_path = os.path.join(pdf_dir, filename)
         print(f"Verarbeite: {filename}")
         
-        # Erst normalen Text-Extraktor probieren
-        text = extract_text_from_pdf(pdf_path)
-        
-        # Wenn kein Text vorhanden → OCR
-        if not text.strip():
-            print("⚠ Kein Text gefunden – OCR wird verwendet.")
-            text = ocr_from_pdf(pdf_path)
+        # Textebene, bei fehlendem Text → OCR (gemeinsame Engine wie in der App);
+        # anders als bei der Extraktion ohne MAX_PAGES-Grenze, damit der Export vollständig ist
+        text = read_pdf_text(pdf_path, max_pages=EXPORT_MAX_PAGES)
         
         # Speichern als TXT
         txt_filename = os.path.splitext(filename)[0] + ".txt"
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""
+export_inference_model.py – schlankes Inferenz-Modell aus dem trainierten NER-Modell erzeugen
+
+- entfernt Komponenten, die die NER nicht braucht (deaktivierter senter, tok2vec ohne Listener)
+- Wortvektoren: die NER nutzt eigene HashEmbed-Features (pretrained_vectors = null), die
+  300-dim de_vectors werden dann komplett entfernt; sonst auf das Rechnungs-Vokabular gekürzt
+- vergleicht F1 auf data/splits/test.jsonl vor/nach dem Export sowie Ladezeit und Speicher
+
+Aufruf (aus dem Projekt-Root):
+    python training/export_inference_model.py
+    python training/export_inference_model.py --src models/ner_model_best --out models/ner_model_infer --vectors corpus
+
+Nutzung in App/Batch/Dienst:  NER_MODEL=models/ner_model_infer
+"""
+
+import argparse
+import glob
+import json
+import os
+import shutil
+import subprocess
+import sys
+
+import spacy
+from spacy.training import Example
+from spacy.vectors import Vectors
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# -------------------- Argumente --------------------
+parser = argparse.ArgumentParser(description="Trainiertes NER-Modell für die Inferenz verschlanken")
+parser.add_argument("--src", default=os.path.join(ROOT, "models", "ner_model_best"), help="Quellmodell")
+parser.add_argument("--out", default=os.path.join(ROOT, "models", "ner_model_infer"), help="Zielordner")
+parser.add_argument("--test", default=os.path.join(ROOT, "data", "splits", "test.jsonl"), help="Test-Split")
+parser.add_argument("--keep", default="ner", help="Kommagetrennte Komponenten, die bleiben sollen")
+parser.add_argument("--vectors", choices=["auto", "drop", "corpus", "keep"], default="auto",
+                    help="auto: entfernen, wenn keine Komponente sie nutzt, sonst 'corpus'; "
+                         "corpus: nur Wörter aus data/ und text/ behalten")
+parser.add_argument("--tolerance", type=float, default=0.0, help="Erlaubter F1-Verlust (absolut)")
+args = parser.parse_args()
+
+# -------------------- Evaluation --------------------
+def load_examples(nlp, path):
+    """Test-JSONL (label/labels/entities als [start, end, label]) → spaCy-Examples."""
+    examples = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            raw = item.get("labels") or item.get("label") or item.get("entities") or []
+            spans = [(int(s), int(e), lbl) for s, e, lbl in raw]
+            examples.append(Example.from_dict(nlp.make_doc(item["text"]), {"entities": spans}))
+    return examples
+
+def evaluate(nlp, path):
+    scores = nlp.evaluate(load_examples(nlp, path))
+    return scores["ents_f"] or 0.0, {k: v["f"] for k, v in (scores["ents_per_type"] or {}).items()}
+
+def dir_size_mb(path):
+    total = 0
+    for dirpath, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(dirpath, f)) for f in files)
+    return total / (1024 * 1024)
+
+def measure_load(path):
+    """Ladezeit und RSS in einem frischen Prozess (sonst teilen sich beide Modelle den Speicher)."""
+    code = (
+        "import time, resource, sys, spacy\n"
+        "t0 = time.perf_counter(); spacy.load(sys.argv[1]); dt = time.perf_counter() - t0\n"
+        "print(dt, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024)\n"
+    )
+    try:
+        out = subprocess.check_output([sys.executable, "-c", code, path], text=True)
+        load_s, rss_mb = map(float, out.split())
+        return load_s, rss_mb
+    except Exception:
+        return None, None  # z. B. Windows (kein resource-Modul)
+
+# -------------------- Trimmen --------------------
+def uses_static_vectors(nlp):
+    """True, wenn irgendeine verbleibende Komponente laut Config die Wortvektoren einliest."""
+    cfg = json.dumps(nlp.config.interpolate().get("components", {}))
+    return '"include_static_vectors": true' in cfg or '"pretrained_vectors": true' in cfg
+
+def drop_components(nlp, keep):
+    removed = []
+    for name in list(nlp.component_names):
+        if name in keep:
+            continue
+        pipe = nlp.get_pipe(name)
+        # Ein tok2vec, auf den eine behaltene Komponente hört, muss bleiben
+        listeners = getattr(pipe, "listening_components", [])
+        if any(c in keep for c in listeners):
+            continue
+        nlp.remove_pipe(name)
+        removed.append(name)
+    return removed
+
+def corpus_words(nlp):
+    """Alle Token aus Trainingsdaten und exportierten Rechnungstexten (auch klein geschrieben)."""
+    paths = glob.glob(os.path.join(ROOT, "data", "splits", "*.jsonl"))
+    texts = []
+    for p in paths:
+        with open(p, "r", encoding="utf-8") as f:
+            texts.extend(json.loads(line)["text"] for line in f if line.strip())
+    for p in glob.glob(os.path.join(ROOT, "text", "**", "*.txt"), recursive=True):
+        with open(p, "r", encoding="utf-8", errors="ignore") as f:
+            texts.append(f.read())
+    words = set()
+    for doc in nlp.tokenizer.pipe(texts):
+        for t in doc:
+            words.update((t.text, t.lower_, t.norm_))
+    return words
+
+def prune_vectors(nlp, words):
+    """Vektortabelle auf die gegebenen Wörter reduzieren (gleiche Dimension, neue Zeilen)."""
+    old = nlp.vocab.vectors
+    keep = [(w, nlp.vocab.strings.add(w)) for w in sorted(words)]
+    keep = [(w, key) for w, key in keep if key in old]
+    new = Vectors(strings=nlp.vocab.strings, shape=(len(keep), old.shape[1]), name=old.name)
+    for w, key in keep:
+        new.add(key, vector=old[key])
+    nlp.vocab.vectors = new
+    return len(keep)
+
+def clear_vectors(nlp):
+    nlp.vocab.vectors = Vectors(strings=nlp.vocab.strings, shape=(0, 0))
+
+# -------------------- Export --------------------
+keep = [c.strip() for c in args.keep.split(",") if c.strip()]
+
+print(f"Lade Quellmodell: {args.src}")
+nlp = spacy.load(args.src)
+base_f1, base_per_type = evaluate(nlp, args.test)
+print(f"Vorher:  Komponenten={nlp.component_names} | Vektoren={nlp.vocab.vectors.shape} | Test-F1={base_f1:.3f}")
+
+removed = drop_components(nlp, keep)
+mode = args.vectors
+if mode == "auto":
+    mode = "corpus" if uses_static_vectors(nlp) else "drop"
+if mode == "drop":
+    clear_vectors(nlp)
+elif mode == "corpus":
+    n = prune_vectors(nlp, corpus_words(nlp))
+    print(f"Vektoren auf {n} Wörter aus dem Rechnungskorpus gekürzt")
+
+new_f1, new_per_type = evaluate(nlp, args.test)
+print(f"Nachher: Komponenten={nlp.component_names} (entfernt: {removed or '-'}) | "
+      f"Vektoren={nlp.vocab.vectors.shape} ({mode}) | Test-F1={new_f1:.3f}")
+for label in sorted(set(base_per_type) | set(new_per_type)):
+    before, after = base_per_type.get(label, 0.0), new_per_type.get(label, 0.0)
+    if abs(before - after) > 1e-9:
+        print(f"  {label:<22} {before:.3f} → {after:.3f}")
+
+if new_f1 < base_f1 - args.tolerance:
+    sys.exit(f"❌ F1 gesunken ({base_f1:.3f} → {new_f1:.3f}), Export abgebrochen.")
+
+nlp.meta["name"] = f"{nlp.meta.get('name', 'model')}_infer"
+nlp.meta["description"] = f"Inferenz-Export von {os.path.basename(os.path.normpath(args.src))}: nur {', '.join(nlp.pipe_names)}"
+if os.path.isdir(args.out):
+    shutil.rmtree(args.out)
+nlp.to_disk(args.out)
+
+src_load, src_rss = measure_load(args.src)
+out_load, out_rss = measure_load(args.out)
+print(f"\nGröße:  {dir_size_mb(args.src):.1f} MB → {dir_size_mb(args.out):.1f} MB")
+if src_load is not None and out_load is not None:
+    print(f"Laden:  {src_load:.2f} s → {out_load:.2f} s")
+    print(f"RSS:    {src_rss:.0f} MB → {out_rss:.0f} MB")
+print(f"✅ Inferenz-Modell gespeichert nach: {args.out}  (nutzen mit NER_MODEL={args.out})")
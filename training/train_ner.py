@@ -4,10 +4,12 @@ train_ner.py – Training für dein NER-Modell mit deutschen Pretrained Embeddin
 """
 
 import json
+import hashlib
 from pathlib import Path
 import random
 import numpy as np
 import spacy
+from spacy.tokens import DocBin
 from spacy.training.example import Example
 from spacy.util import minibatch, compounding, fix_random_seed
 
@@ -17,6 +19,7 @@ train_path = BASE / "train.jsonl"
 dev_path   = BASE / "dev.jsonl"
 out_dir    = BASE / "ner_model"        # aktuelles Modell
 best_dir   = BASE / "ner_model_best"   # bestes Dev-F1-Modell
+cache_dir  = BASE / ".train_cache"     # vorverarbeitete Trainings-Examples (DocBin)
 
 # -------------------- Seeds fixen (Reproduzierbarkeit) --------------------
 fix_random_seed(42)
@@ -60,11 +63,33 @@ for _, ann in train_data:
 # Optimizer initialisieren
 optimizer = nlp.begin_training()
 
+# -------------------- Examples einmal bauen & cachen --------------------
+def cached_examples(nlp, path: Path, data):
+    """
+    Gold-Docs einmal erzeugen und als DocBin speichern; der Schlüssel hängt an den Daten,
+    der spaCy- und der Basismodell-Version. Die Examples werden in allen Epochen wiederverwendet.
+    """
+    key = path.read_bytes() + f"{spacy.__version__}|{nlp.meta.get('name')}-{nlp.meta.get('version')}".encode()
+    cache = cache_dir / f"{path.stem}.{hashlib.sha256(key).hexdigest()[:12]}.spacy"
+    if cache.exists():
+        docs = list(DocBin().from_disk(cache).get_docs(nlp.vocab))
+        print(f"Examples aus Cache: {cache}")
+    else:
+        docs = [Example.from_dict(nlp.make_doc(text), ann).reference for text, ann in data]
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        DocBin(docs=docs).to_disk(cache)
+        print(f"Examples gecacht: {cache}")
+    return [Example(nlp.make_doc(doc.text), doc) for doc in docs]
+
+train_examples = cached_examples(nlp, train_path, train_data)
+
 # -------------------- Evaluation --------------------
+EVAL_BATCH = 32
+
 def evaluate(nlp, data):
     tp = fp = fn = 0
-    for text, ann in data:
-        pred = nlp(text)
+    preds = nlp.pipe((text for text, _ in data), batch_size=EVAL_BATCH)
+    for pred, (text, ann) in zip(preds, data):
         pred_ents = {(ent.start_char, ent.end_char, ent.label_) for ent in pred.ents}
         gold_ents = {(s, e, lbl) for s, e, lbl in ann["entities"]}
         tp += len(pred_ents & gold_ents)
@@ -76,20 +101,18 @@ def evaluate(nlp, data):
     return prec, rec, f1, tp, fp, fn
 
 # -------------------- Training --------------------
-EPOCHS = 180  # ~10–15 Min auf CPU
+EPOCHS = 180    # Obergrenze, meist greift vorher das Early Stopping
+PATIENCE = 25   # Abbruch nach so vielen Epochen ohne besseres Dev-F1
 best_f1 = -1.0
+best_epoch = 0
 
 for epoch in range(1, EPOCHS + 1):
-    random.shuffle(train_data)
+    random.shuffle(train_examples)
     losses = {}
 
     # batch size wächst bis 48
-    for batch in minibatch(train_data, size=compounding(4.0, 48.0, 1.5)):
-        examples = []
-        for text, ann in batch:
-            doc = nlp.make_doc(text)
-            examples.append(Example.from_dict(doc, ann))
-        nlp.update(examples, drop=0.40, sgd=optimizer, losses=losses)  # Dropout leicht erhöht
+    for batch in minibatch(train_examples, size=compounding(4.0, 48.0, 1.5)):
+        nlp.update(batch, drop=0.40, sgd=optimizer, losses=losses)  # Dropout leicht erhöht
 
     # Dev-Eval
     prec, rec, f1, tp, fp, fn = evaluate(nlp, dev_data)
@@ -100,11 +123,15 @@ for epoch in range(1, EPOCHS + 1):
     # Best-Checkpoint sichern
     if f1 > best_f1:
         best_f1 = f1
+        best_epoch = epoch
         best_dir.mkdir(parents=True, exist_ok=True)
         nlp.to_disk(best_dir)
+    elif epoch - best_epoch >= PATIENCE:
+        print(f"Early Stopping in Epoche {epoch:03d}: seit {PATIENCE} Epochen kein besseres Dev-F1")
+        break
 
 # -------------------- Modelle speichern --------------------
 out_dir.mkdir(parents=True, exist_ok=True)
 nlp.to_disk(out_dir)
-print(f"Bestes Dev-F1: {best_f1:.3f} -> gespeichert in {best_dir}")
+print(f"Bestes Dev-F1: {best_f1:.3f} (Epoche {best_epoch}) -> gespeichert in {best_dir}")
 print(f"✅ Aktuelles Modell gespeichert nach: {out_dir}")